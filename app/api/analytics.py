@@ -0,0 +1,120 @@
+"""
+Сбор аналитических событий с пакетной записью в таблицу ``analytics``.
+
+Обработчики вызывают ``analytics.track(key, **fields)``: событие только
+кладётся в буфер в памяти, без обращения к БД. Фоновая задача сбрасывает
+буфер одним executemany-INSERT, когда в нём набралось ``batch_size``
+событий или прошло ``flush_interval`` секунд. Буфер ограничен
+``max_buffer`` событиями: при переполнении новые события отбрасываются и
+учитываются в ``dropped``. При остановке буфер сбрасывается полностью.
+
+Строка ``analytics``: ``key`` - тип события (``search``, ``button``,
+``checkout``, ``handler_latency``...), ``value`` - поля события в JSON,
+``recorded_at`` - время события. Первичный ключ - автоинкрементный
+``id_event``, так что события разных воркеров с одинаковым временем не
+теряются.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import datetime
+
+from app.api.dao import AnalyticsDAO
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsCollector:
+    def __init__(self, max_buffer: int = 10000, batch_size: int = 500, flush_interval: float = 5.0):
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: deque[dict] = deque()
+        self._batch_ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        # Метрики
+        self.tracked = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.errors = 0
+
+    def track(self, key: str, **fields) -> bool:
+        """Ставит событие в буфер; False, если буфер переполнен и событие отброшено."""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return False
+        self._buffer.append({"key": key, "value": json.dumps(fields, ensure_ascii=False, default=str),
+                             "recorded_at": datetime.now()})
+        self.tracked += 1
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_loop(), name="analytics-flush")
+
+    async def flush(self) -> int:
+        """Записывает накопленные события пачками по ``batch_size``, возвращает число записанных."""
+        written = 0
+        async with self._flush_lock:
+            while self._buffer:
+                count = min(self.batch_size, len(self._buffer))
+                rows = [self._buffer.popleft() for _ in range(count)]
+                self.flushes += 1
+                try:
+                    inserted = await AnalyticsDAO.insert_events(rows)
+                except BaseException:
+                    # Ошибка или отмена задачи при остановке: возвращаем пачку
+                    # в начало буфера, сколько поместится
+                    room = max(self.max_buffer - len(self._buffer), 0)
+                    self._buffer.extendleft(reversed(rows[:room]))
+                    self.dropped += max(len(rows) - room, 0)
+                    raise
+                written += inserted
+                self.written += inserted
+        return written
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Не удалось записать события аналитики: %s", e)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self.errors += 1
+            logger.error("Не удалось записать события аналитики при остановке, потеряно %s: %s",
+                         len(self._buffer), e)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "tracked": self.tracked,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "errors": self.errors,
+        }
+
+
+analytics = AnalyticsCollector(max_buffer=settings.ANALYTICS_BUFFER_SIZE,
+                               batch_size=settings.ANALYTICS_BATCH_SIZE,
+                               flush_interval=settings.ANALYTICS_FLUSH_INTERVAL)
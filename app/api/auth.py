@@ -0,0 +1,51 @@
+"""
+Проверка доступа к HTTP API.
+
+Веб-приложение Telegram передаёт строку ``initData`` в заголовке
+``X-Telegram-Init-Data``. Её подпись проверяется токеном бота, а клиент
+берётся из подписанного поля ``user``, а не из параметров запроса.
+Админские выгрузки пускают администратора с такой же подписью или
+скрипт с секретным токеном ``ADMIN_API_TOKEN`` в заголовке
+``Authorization: Bearer <токен>``.
+"""
+import hmac
+from datetime import datetime, timezone
+
+from aiogram.utils.web_app import WebAppUser, safe_parse_webapp_init_data
+from fastapi import Header, HTTPException
+
+from app.config import settings
+
+
+def parse_init_data(init_data: str) -> WebAppUser:
+    """Проверяет подпись и срок действия initData, возвращает клиента; ValueError, если проверка не прошла."""
+    data = safe_parse_webapp_init_data(settings.BOT_TOKEN, init_data)
+    age = (datetime.now(timezone.utc) - data.auth_date).total_seconds()
+    if settings.WEBAPP_AUTH_MAX_AGE and age > settings.WEBAPP_AUTH_MAX_AGE:
+        raise ValueError("initData устарела")
+    if data.user is None:
+        raise ValueError("В initData нет клиента")
+    return data.user
+
+
+async def webapp_user(x_telegram_init_data: str | None = Header(None)) -> WebAppUser:
+    """Зависимость FastAPI: клиент веб-приложения по подписанной initData."""
+    if not x_telegram_init_data:
+        raise HTTPException(status_code=401)
+    try:
+        return parse_init_data(x_telegram_init_data)
+    except ValueError:
+        raise HTTPException(status_code=401)
+
+
+async def require_admin(authorization: str | None = Header(None),
+                        x_telegram_init_data: str | None = Header(None)) -> None:
+    """Зависимость FastAPI: пропускает по секретному токену или по initData администратора."""
+    if authorization and settings.ADMIN_API_TOKEN:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), settings.ADMIN_API_TOKEN.encode()):
+            return
+        raise HTTPException(status_code=401)
+    user = await webapp_user(x_telegram_init_data)
+    if user.id not in settings.ADMIN_ID:
+        raise HTTPException(status_code=403)
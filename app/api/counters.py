@@ -0,0 +1,51 @@
+import asyncio
+import logging
+
+from app.api.dao import StatsDAO
+
+
+logger = logging.getLogger(__name__)
+
+
+class CounterReconciler:
+    """
+    Периодически сверяет счётчики строк с COUNT(*).
+
+    Триггеры держат счётчики точными, сверка страхует от расхождений после
+    ручных правок БД или изменений схемы, пересоздавших таблицу без триггеров.
+    """
+
+    def __init__(self, interval: float = 3600.0):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+        # Метрики
+        self.runs = 0
+        self.corrections = 0
+        self.errors = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._reconcile_loop(), name="stats-reconcile")
+
+    async def reconcile_once(self) -> dict:
+        self.runs += 1
+        fixed = await StatsDAO.reconcile()
+        self.corrections += len(fixed)
+        return fixed
+
+    async def _reconcile_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile_once()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Не удалось сверить счётчики строк: %s", e)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "corrections": self.corrections, "errors": self.errors}
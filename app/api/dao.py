@@ -1,134 +1,408 @@
 import logging
-from sqlalchemy import event
+import time
+from datetime import date, datetime
+from typing import NamedTuple
+from sqlalchemy import String, event, insert, literal, text, type_coerce
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.future import select
-from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete, func
+from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete, func, tuple_
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload, object_session
 from app.dao.base import BaseDAO
-from app.api.models import User, Order, OrderItem, ExchangeRate
-from app.database import async_session_maker
+from app.dao.cache import TTLCache
+from app.dao.writer import writer_operation
+from app.config import settings
+from app.api.models import User, Product, Order, OrderItem, ExchangeRate, BotState, Broadcast, BroadcastDelivery, \
+    Analytics, UserSession, TableCounter, COUNTED_TABLES, SalesRollup, CategorySalesRollup, ROLLUP_PERIODS
+from app.database import Base, unit_of_work, read_session, after_commit
 
 
 logger = logging.getLogger(__name__)
 
 
+class CachedUser(NamedTuple):
+    """Лёгкая запись клиента для кэша: только то, что нужно обработчикам бота."""
+    user_id: int
+    telegram_id: int
+    full_name: str
+    phone: str | None
+
+
+# Кэш клиентов по telegram_id; сбрасывается при записи через UserDAO
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+# Страницы истории заказов: telegram_id -> {параметры страницы: ответ}; сбрасывается при новом заказе
+order_history_cache = TTLCache(maxsize=settings.ORDER_HISTORY_CACHE_SIZE, ttl=settings.ORDER_HISTORY_CACHE_TTL)
+
 
 class UserDAO(BaseDAO):
     model = User
 
+    # Поля register_or_update -> колонки users
+    _PROFILE_FIELDS = {'first_name': 'first_name', 'last_name': 'last_name', 'username': 'username',
+                       'phone': 'phone', 'address': 'delivery_address', 'city': 'city', 'email': 'email'}
+
+    @classmethod
+    def _profile_values(cls, telegram_id: int, data: dict) -> tuple[dict, list[str]]:
+        """
+        Готовит значения для вставки клиента и список колонок для обновления.
+
+        Обновляются только переданные (не None) поля; имя пересчитывается,
+        только если передано имя или фамилия.
+        """
+        values = {column: data[field] for field, column in cls._PROFILE_FIELDS.items()
+                  if data.get(field) is not None}
+        if data.get('first_name') or data.get('last_name'):
+            values['full_name'] = f"{data.get('first_name') or 'Клиент'} {data.get('last_name') or ''}".strip()
+        update_columns = list(values)
+        values.setdefault('full_name', 'Клиент')
+        values['telegram_id'] = telegram_id
+        return values, update_columns
+
     @classmethod
+    @writer_operation
     async def register_or_update(cls, telegram_id: int, **data):
-        """Регистрирует или обновляет клиента."""
-        async with async_session_maker() as session:
-            try:
-                # Начинаем транзакцию
-                async with session.begin():
-                    # 1. Ищем пользователя
-                    query = select(cls.model).filter_by(telegram_id=telegram_id)
-                    result = await session.execute(query)
-                    user = result.scalar_one_or_none()
-
-                    # 2. Готовим данные
-                    first_name = data.get('first_name') or "Клиент"
-                    last_name = data.get('last_name') or " "
-                    full_name = f"{first_name} {last_name}".strip()
-
-                    if user:
-                        # 3a. Обновляем существующего пользователя
-                        user.full_name = full_name
-                        user.username = data.get('username')
-                        user.phone = data.get('phone')
-                        user.delivery_address = data.get('address')
-                        user.city = data.get('city')
-                        user.email = data.get('email')
-                        user.updated_at = func.now()
-                        logger.info("Клиент %s обновлён", telegram_id)
-                    else:
-                        # 3b. Создаём нового пользователя с правильными аргументами
-                        user = cls.model(
-                            telegram_id=telegram_id,
-                            full_name=full_name,
-                            username=data.get('username'),
-                            phone=data.get('phone'),
-                            delivery_address=data.get('address'),
-                            city=data.get('city'),
-                            email=data.get('email'),
-                        )
-                        session.add(user)
-                        logger.info("Клиент %s зарегистрирован", telegram_id)
-
-                # После коммита возвращаем объект пользователя
-                return await session.get(cls.model, user.user_id)
-            except SQLAlchemyError as e:
-                logger.error("Ошибка регистрации клиента %s: %s", telegram_id, e)
-                return None
+        """
+        Регистрирует или обновляет клиента одним INSERT ... ON CONFLICT ... RETURNING.
+
+        Существующему клиенту меняются только переданные поля, остальные
+        (например, телефон и адрес) остаются как были.
+        """
+        values, update_columns = cls._profile_values(telegram_id, data)
+        query = sqlite_insert(cls.model).values(**values)
+        # Пустой SET всё равно нужен: DO NOTHING не вернул бы строку через RETURNING
+        set_ = cls._with_server_onupdate({column: query.excluded[column] for column in update_columns}) \
+            or {'telegram_id': query.excluded.telegram_id}
+        query = (
+            query.on_conflict_do_update(index_elements=[cls.model.telegram_id], set_=set_)
+            .returning(cls.model)
+            .execution_options(populate_existing=True)
+        )
+        try:
+            async with unit_of_work() as session:
+                user = (await session.scalars(query)).one()
+                # Сброс до коммита дал бы параллельному чтению закэшировать старую запись
+                after_commit(session, lambda: user_cache.invalidate(telegram_id))
+            logger.info("Клиент %s зарегистрирован или обновлён", telegram_id)
+            return user
+        except SQLAlchemyError as e:
+            logger.error("Ошибка регистрации клиента %s: %s", telegram_id, e)
+            return None
+
+    @classmethod
+    @writer_operation
+    async def register_many(cls, users: list[dict]) -> dict:
+        """
+        Пакетный вариант ``register_or_update`` для импорта клиентов.
+
+        Каждый элемент - словарь с ``telegram_id`` и теми же полями. Клиенты
+        с одинаковым набором переданных полей записываются одним
+        ``bulk_upsert``. Возвращает ``{"inserted": ..., "updated": ...}``.
+        """
+        groups: dict[tuple, tuple[list[str], list[dict]]] = {}
+        for data in users:
+            data = dict(data)
+            values, update_columns = cls._profile_values(data.pop('telegram_id'), data)
+            groups.setdefault((tuple(values), tuple(update_columns)), (update_columns, []))[1].append(values)
+        totals = {"inserted": 0, "updated": 0}
+        async with unit_of_work() as session:
+            for update_columns, rows in groups.values():
+                result = await cls.bulk_upsert(rows, index_elements=['telegram_id'], update_columns=update_columns)
+                totals["inserted"] += result["inserted"]
+                totals["updated"] += result["updated"]
+
+            def invalidate_cache():
+                for _, rows in groups.values():
+                    for values in rows:
+                        user_cache.invalidate(values['telegram_id'])
+            after_commit(session, invalidate_cache)
+        return totals
+
+    @classmethod
+    async def get_cached(cls, telegram_id: int) -> CachedUser | None:
+        """
+        Возвращает клиента по telegram_id через кэш в памяти.
+
+        Повторный визит не обращается к БД, пока запись не устарела или не
+        сброшена записью через ``register_or_update``/``register_many``.
+        Отсутствие клиента не кэшируется: за ним сразу следует регистрация.
+        """
+        user = user_cache.get(telegram_id)
+        if user is None:
+            version = user_cache.version(telegram_id)
+            async with read_session() as session:
+                row = (await session.execute(
+                    select(cls.model.user_id, cls.model.telegram_id, cls.model.full_name, cls.model.phone)
+                    .filter_by(telegram_id=telegram_id)
+                )).first()
+            if row is not None:
+                user = CachedUser(*row)
+                user_cache.set(telegram_id, user, version)
+        return user
+
+
+def _parse_order_date(value):
+    """Приводит дату заказа из web_app к datetime; None - оставить значение БД по умолчанию."""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, '%d.%m.%Y %H:%M:%S')
+
+
+class ProductDAO(BaseDAO):
+    model = Product
+
+    @classmethod
+    async def import_catalog(cls, rows: list[dict]) -> dict:
+        """Загружает каталог: новые товары добавляет, существующие обновляет по ``taobao_item_id``."""
+        result = await cls.bulk_upsert(rows, index_elements=["taobao_item_id"])
+        logger.info("Импорт каталога: добавлено %s, обновлено %s", result["inserted"], result["updated"])
+        return result
+
+    @classmethod
+    async def id_bounds(cls) -> tuple[int | None, int | None]:
+        """Минимальный и максимальный id товара - границы пачек пересчёта."""
+        # Отдельные подзапросы: MIN и MAX в одном SELECT SQLite считает полным проходом
+        query = select(select(func.min(cls.model.id_product)).scalar_subquery(),
+                       select(func.max(cls.model.id_product)).scalar_subquery())
+        async with read_session() as session:
+            return tuple((await session.execute(query)).one())
+
+    @classmethod
+    def _reprice_filter(cls, after_id: int, last_id: int, new_price):
+        return (cls.model.id_product > after_id, cls.model.id_product <= last_id,
+                cls.model.original_price_yuan > 0, cls.model.price_rub != new_price)
+
+    @classmethod
+    @writer_operation
+    async def reprice_range(cls, after_id: int, last_id: int, new_price) -> int:
+        """Одним UPDATE пересчитывает цены товаров с id в (after_id, last_id]; возвращает число изменённых."""
+        async with unit_of_work() as session:
+            query = (
+                sqlalchemy_update(cls.model)
+                .where(*cls._reprice_filter(after_id, last_id, new_price))
+                .values(price_rub=new_price, last_updated=cls.model.last_updated.server_onupdate.arg)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(query)
+            return result.rowcount
+
+    @classmethod
+    async def price_diff(cls, after_id: int, last_id: int, new_price) -> list:
+        """Товары из диапазона, цена которых изменится: (id_product, name, price_rub, new_price)."""
+        async with read_session() as session:
+            query = (
+                select(cls.model.id_product, cls.model.name, cls.model.price_rub, new_price.label('new_price'))
+                .where(*cls._reprice_filter(after_id, last_id, new_price))
+                .order_by(cls.model.id_product)
+            )
+            return (await session.execute(query)).all()
+
+
+class ExchangeRateDAO(BaseDAO):
+    """
+    Курс юаня к рублю.
+
+    Текущий курс хранится в памяти процесса: читается из БД при первом
+    обращении и обновляется после коммита транзакции, добавившей новую
+    запись ``ExchangeRate`` через ORM, так что оформление заказа обычно
+    таблицу курсов не читает. Курс, записанный другим процессом или
+    напрямую SQL, виден не позже чем через ``EXCHANGE_RATE_TTL`` секунд:
+    после этого курс перечитывается из БД.
+    """
+    model = ExchangeRate
+
+    _current: float | None = None
+    _loaded_at = 0.0
+    reloads = 0
+    updates = 0
+
+    @classmethod
+    async def current_rate(cls) -> float:
+        if cls._current is None or time.monotonic() - cls._loaded_at > settings.EXCHANGE_RATE_TTL:
+            await cls.reload()
+        return cls._current
+
+    @classmethod
+    async def reload(cls) -> float:
+        """Перечитывает последний курс из БД."""
+        async with read_session() as session:
+            rate = await session.scalar(
+                select(cls.model.rate_rub).order_by(cls.model.recorded_at.desc(), cls.model.id_rate.desc()).limit(1)
+            )
+        cls._current = rate or settings.EXCHANGE_RATE_DEFAULT
+        cls._loaded_at = time.monotonic()
+        cls.reloads += 1
+        return cls._current
+
+    @classmethod
+    def _publish(cls, rate: float) -> None:
+        cls._current = rate
+        cls._loaded_at = time.monotonic()
+        cls.updates += 1
+
+    @classmethod
+    @writer_operation
+    async def record(cls, rate_rub: float, source: str = 'manual') -> None:
+        """Сохраняет новый курс; кэш обновится после коммита."""
+        async with unit_of_work() as session:
+            session.add(cls.model(rate_rub=rate_rub, source=source))
+            await session.flush()
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {"rate_rub": cls._current, "reloads": cls.reloads, "updates": cls.updates}
+
+
+@event.listens_for(ExchangeRate, "after_insert")
+def _remember_new_rate(mapper, connection, target):
+    # Публикуется после коммита внешней транзакции; откат (в том числе
+    # точки сохранения со вставкой) курс отбрасывает
+    rate = target.rate_rub
+    after_commit(object_session(target), lambda: ExchangeRateDAO._publish(rate))
 
 
 class OrderDAO(BaseDAO):
     model = Order
 
     @classmethod
+    @writer_operation
     async def save_order_with_items(cls, user_info: dict, order_data: dict):
         """Сохраняет заказ и позиции в БД."""
-        async with async_session_maker() as session:
-            try:
-                async with session.begin():
-                    user_id = user_info.get('id')
-                    if not user_id:
-                        logger.error("Нет user_id в user_info")
-                        return None
-
-                    customer = await session.scalar(select(User).filter_by(telegram_id=user_id))
-                    if not customer:
-                        customer = await UserDAO.register_or_update(
-                            telegram_id=user_id,
-                            first_name=user_info.get('first_name') or user_info.get('name', 'Клиент'),
-                            last_name=user_info.get('last_name'),
-                            username=user_info.get('username'),
-                            phone=user_info.get('phone'),
-                            address=user_info.get('address'),
-                            city=user_info.get('city'),
-                            email=user_info.get('email')
-                        )
-                        if not customer:
-                            logger.error("Не удалось создать или найти клиента %s", user_id)
-                            return None
-
-                    rate_query = select(ExchangeRate.rate_rub).order_by(ExchangeRate.recorded_at.desc()).limit(1)
-                    exchange_rate = (await session.execute(rate_query)).scalar_one_or_none() or 12.5
-
-                    new_order = Order(
-                        id_customer=customer.user_id,
-                        total_amount_rub=round(order_data['total'], 2),
-                        delivery_address=user_info.get('address', 'Не указан'),
-                        order_date=order_data['timestamp'],
-                        exchange_rate_used=exchange_rate
-                    )
-                    session.add(new_order)
-                    await session.flush()
-                    order_id = new_order.id_order
-
-                    items_to_add = [OrderItem(
-                        id_order=order_id, id_product=item.get('id_product'),
-                        product_name=item['name'], product_price_rub=item['price'],
-                        size=item.get('size'), color=item.get('color'),
-                        quantity=item.get('quantity', 1),
-                        subtotal=item['price'] * item.get('quantity', 1)
-                    ) for item in order_data['items']]
-                    session.add_all(items_to_add)
-
-                logger.info("Заказ #%s сохранён для пользователя %s", order_id, user_id)
-                return order_id
-            except SQLAlchemyError as e:
-                logger.error("Ошибка сохранения заказа: %s", e)
-                return None
+        try:
+            async with unit_of_work() as session:
+                user_id = user_info.get('id')
+                if not user_id:
+                    logger.error("Нет user_id в user_info")
+                    return None
+
+                customer = await UserDAO.register_or_update(
+                    telegram_id=user_id,
+                    first_name=user_info.get('first_name') or user_info.get('name'),
+                    last_name=user_info.get('last_name'),
+                    username=user_info.get('username'),
+                    phone=user_info.get('phone'),
+                    address=user_info.get('address'),
+                    city=user_info.get('city'),
+                    email=user_info.get('email')
+                )
+                if not customer:
+                    logger.error("Не удалось создать или найти клиента %s", user_id)
+                    return None
+
+                exchange_rate = await ExchangeRateDAO.current_rate()
+
+                new_order = Order(
+                    id_customer=customer.user_id,
+                    total_amount_rub=round(order_data['total'], 2),
+                    delivery_address=user_info.get('address', 'Не указан'),
+                    exchange_rate_used=exchange_rate
+                )
+                order_date = _parse_order_date(order_data.get('timestamp'))
+                if order_date is not None:
+                    new_order.order_date = order_date
+                session.add(new_order)
+                await session.flush()
+                order_id = new_order.id_order
+
+                items_to_add = [OrderItem(
+                    id_order=order_id, id_product=item.get('id_product'),
+                    product_name=item['name'], product_price_rub=item['price'],
+                    size=item.get('size'), color=item.get('color'),
+                    quantity=item.get('quantity', 1),
+                    subtotal=item['price'] * item.get('quantity', 1)
+                ) for item in order_data['items']]
+                session.add_all(items_to_add)
+                await session.flush()
+                total_rub = new_order.total_amount_rub
+
+                def order_committed():
+                    # analytics импортирует этот модуль, поэтому импорт здесь
+                    from app.api.analytics import analytics
+                    order_history_cache.invalidate(user_id)
+                    analytics.track("checkout", telegram_id=user_id, id_order=order_id,
+                                    total_rub=total_rub, items=len(items_to_add))
+                    logger.info("Заказ #%s сохранён для пользователя %s", order_id, user_id)
+                # Внутри апдейта коммитит middleware, уже после возврата id
+                after_commit(session, order_committed)
+            return order_id
+        except SQLAlchemyError as e:
+            logger.error("Ошибка сохранения заказа: %s", e)
+            return None
+
+    @classmethod
+    async def get_history(cls, telegram_id: int, limit: int = 20,
+                          before: tuple[datetime, int] | None = None) -> dict:
+        """
+        Страница истории заказов клиента, новые сначала, вместе с позициями.
+
+        Запросов всегда не больше двух: заказы по индексу
+        ``(id_customer, order_date)`` и все их позиции одним ``IN``
+        (selectinload); клиент берётся из кэша. ``before`` - курсор
+        ``(order_date, id_order)`` последнего заказа предыдущей страницы.
+        Страницы кэшируются по клиенту до его следующего заказа.
+        """
+        page_key = (limit, before)
+        pages = order_history_cache.get(telegram_id)
+        if pages is not None and page_key in pages:
+            return pages[page_key]
+        version = order_history_cache.version(telegram_id)
+
+        history = {"orders": [], "next_before_date": None, "next_before_id": None}
+        customer = await UserDAO.get_cached(telegram_id)
+        if customer is not None:
+            query = (
+                select(cls.model)
+                .options(selectinload(cls.model.items))
+                .where(cls.model.id_customer == customer.user_id)
+                .order_by(cls.model.order_date.desc(), cls.model.id_order.desc())
+                .limit(limit)
+            )
+            if before is not None:
+                query = query.where(tuple_(cls.model.order_date, cls.model.id_order) < tuple(before))
+            async with read_session() as session:
+                orders = (await session.scalars(query)).all()
+            history["orders"] = [
+                {
+                    "id_order": order.id_order,
+                    "order_date": order.order_date,
+                    "status": order.status,
+                    "payment_status": order.payment_status,
+                    "total_amount_rub": order.total_amount_rub,
+                    "delivery_address": order.delivery_address,
+                    "tracking_number": order.tracking_number,
+                    "items": [
+                        {
+                            "product_name": item.product_name,
+                            "product_price_rub": item.product_price_rub,
+                            "size": item.size,
+                            "color": item.color,
+                            "quantity": item.quantity,
+                            "subtotal": item.subtotal,
+                        }
+                        for item in order.items
+                    ],
+                }
+                for order in orders
+            ]
+            if len(orders) == limit:
+                history["next_before_date"], history["next_before_id"] = orders[-1].order_date, orders[-1].id_order
+
+        if pages is None:
+            pages = {}
+            # Если во время чтения сохранили заказ, страницы не кэшируются
+            order_history_cache.set(telegram_id, pages, version)
+        # Сброс убирает из кэша весь словарь страниц, так что запись в
+        # прежний словарь после сброса уже ни на что не влияет
+        pages[page_key] = history
+        return history
 
     @classmethod
     async def get_recent(cls, limit: int = 10):
         """Возвращает последние заказы с именами клиентов и адресами из заказа."""
         limit = max(1, min(limit, 100))
-        async with async_session_maker() as session:
+        async with read_session() as session:
             try:
                 query = (
                     select(
@@ -145,22 +419,349 @@ class OrderDAO(BaseDAO):
                 logger.error("Ошибка получения заказов: %s", e)
                 return []
 
+    # Колонки выгрузки заказов: заказ, клиент и позиция
+    EXPORT_COLUMNS = (
+        Order.id_order, Order.order_date, Order.status, Order.payment_status, Order.total_amount_rub,
+        Order.exchange_rate_used, Order.delivery_address, Order.tracking_number,
+        User.telegram_id, User.full_name, User.phone,
+        OrderItem.product_name, OrderItem.size, OrderItem.color, OrderItem.quantity,
+        OrderItem.product_price_rub, OrderItem.subtotal,
+    )
+
+    @classmethod
+    async def stream_export(cls, date_from: datetime | None = None, date_to: datetime | None = None,
+                            status: str | None = None, batch_size: int = 1000):
+        """
+        Построчно отдаёт заказы с клиентами и позициями в порядке даты.
+
+        Строки читаются курсором БД порциями по ``batch_size``, поэтому память
+        не зависит от размера таблицы. Позиции одного заказа идут подряд;
+        заказ без позиций даёт одну строку с пустыми полями позиции.
+        """
+        query = (
+            select(*cls.EXPORT_COLUMNS)
+            .join(User, cls.model.id_customer == User.user_id)
+            .outerjoin(OrderItem, OrderItem.id_order == cls.model.id_order)
+            .order_by(cls.model.order_date, cls.model.id_order, OrderItem.id_item)
+            .execution_options(yield_per=batch_size)
+        )
+        if date_from is not None:
+            query = query.where(cls.model.order_date >= date_from)
+        if date_to is not None:
+            query = query.where(cls.model.order_date < date_to)
+        if status is not None:
+            query = query.where(cls.model.status == status)
+        async with read_session() as session:
+            result = await session.stream(query)
+            async for row in result:
+                yield row
+
 
 class StatsDAO:
+    """
+    Счётчики строк ``users`` и ``orders``.
+
+    Значения ведут триггеры SQLite в таблице ``table_counters`` в той же
+    транзакции, что вставляет или удаляет строки, поэтому статистика
+    читается двумя строками по первичному ключу, а не COUNT(*).
+    """
+
     @classmethod
     async def get_stats(cls):
         """Возвращает статистику: количество клиентов и заказов."""
-        async with async_session_maker() as session:
+        async with read_session() as session:
             try:
-                users_query = select(func.count(User.user_id))
-                users = (await session.execute(users_query)).scalar_one()
-                orders_query = select(func.count(Order.id_order))
-                orders = (await session.execute(orders_query)).scalar_one()
-                return {"users": users, "orders": orders}
+                query = select(TableCounter.table_name, TableCounter.row_count) \
+                    .where(TableCounter.table_name.in_(COUNTED_TABLES))
+                counts = dict((await session.execute(query)).all())
+                return {"users": counts.get('users', 0), "orders": counts.get('orders', 0)}
             except SQLAlchemyError as e:
                 logger.error("Ошибка получения статистики: %s", e)
                 return {"users": 0, "orders": 0}
 
+    @classmethod
+    @writer_operation
+    async def reconcile(cls) -> dict:
+        """
+        Сверяет счётчики с COUNT(*) и исправляет расхождения.
+
+        Каждый счётчик исправляется одним UPDATE с подзапросом, чтобы не
+        читать таблицу до захвата блокировки записи. Возвращает
+        исправленные значения разошедшихся счётчиков.
+        """
+        fixed = {}
+        async with unit_of_work() as session:
+            for table in COUNTED_TABLES:
+                actual = select(func.count()).select_from(Base.metadata.tables[table]).scalar_subquery()
+                query = (
+                    sqlalchemy_update(TableCounter)
+                    .where(TableCounter.table_name == table, TableCounter.row_count != actual)
+                    .values(row_count=actual)
+                    .returning(TableCounter.row_count)
+                )
+                row_count = (await session.execute(query)).scalar_one_or_none()
+                if row_count is not None:
+                    fixed[table] = row_count
+        if fixed:
+            logger.warning("Счётчики строк расходились с COUNT(*) и исправлены: %s", fixed)
+        return fixed
+
+
+class RollupDAO:
+    """
+    Агрегаты продаж по часам и дням: ``sales_rollups`` и ``category_sales_rollups``.
+
+    Таблицы ведут триггеры SQLite в той же транзакции, что меняет заказы,
+    позиции и категории товаров (см. ``rollup_ddl``), поэтому отчёты читают
+    готовые строки по первичному ключу вместо прохода по ``orders`` и
+    ``order_items``. ``rebuild_range`` пересобирает агрегаты за диапазон дат.
+    """
+
+    @staticmethod
+    def _bucket(period: str, column):
+        return func.strftime('%Y-%m-%d %H:00', column) if period == 'hour' else func.date(column)
+
+    @staticmethod
+    def _date_range(column, date_from: date, date_to: date):
+        # Строковые границы: дата заказа хранится строкой с секундами или без
+        # долей, а 'YYYY-MM-DD' сравнивается с обоими форматами одинаково
+        return (column >= type_coerce(date_from.isoformat(), String),
+                column < type_coerce(date_to.isoformat(), String))
+
+    @classmethod
+    async def order_date_bounds(cls) -> tuple[datetime | None, datetime | None]:
+        """Дата первого и последнего заказа - границы пересборки агрегатов."""
+        query = select(select(func.min(Order.order_date)).scalar_subquery(),
+                       select(func.max(Order.order_date)).scalar_subquery())
+        async with read_session() as session:
+            return tuple((await session.execute(query)).one())
+
+    @classmethod
+    @writer_operation
+    async def rebuild_range(cls, date_from: date, date_to: date) -> dict:
+        """
+        Пересчитывает агрегаты за дни [date_from, date_to) из orders и order_items.
+
+        Старые строки интервалов удаляются и вставляются заново одной
+        транзакцией, так что заказы, записанные параллельно, не теряются.
+        """
+        counts = {"sales": 0, "categories": 0}
+        async with unit_of_work() as session:
+            for model in (SalesRollup, CategorySalesRollup):
+                await session.execute(sqlalchemy_delete(model).where(
+                    model.period.in_(ROLLUP_PERIODS), *cls._date_range(model.bucket, date_from, date_to)))
+            for period in ROLLUP_PERIODS:
+                bucket = cls._bucket(period, Order.order_date)
+                sales = (
+                    select(literal(period), bucket, Order.status, func.count(), func.sum(Order.total_amount_rub))
+                    .where(*cls._date_range(Order.order_date, date_from, date_to))
+                    .group_by(bucket, Order.status)
+                )
+                result = await session.execute(insert(SalesRollup).from_select(
+                    ['period', 'bucket', 'status', 'order_count', 'revenue_rub'], sales))
+                counts["sales"] += result.rowcount
+                category = func.coalesce(Product.category, '')
+                categories = (
+                    select(literal(period), bucket, Order.status, category, func.count(),
+                           func.sum(OrderItem.quantity), func.sum(OrderItem.subtotal))
+                    .join(OrderItem, OrderItem.id_order == Order.id_order)
+                    .outerjoin(Product, Product.id_product == OrderItem.id_product)
+                    .where(*cls._date_range(Order.order_date, date_from, date_to))
+                    .group_by(bucket, Order.status, category)
+                )
+                result = await session.execute(insert(CategorySalesRollup).from_select(
+                    ['period', 'bucket', 'status', 'category', 'item_count', 'quantity', 'revenue_rub'], categories))
+                counts["categories"] += result.rowcount
+        return counts
+
+    @classmethod
+    async def get_sales(cls, period: str, date_from: date, date_to: date, status: str | None = None) -> list[dict]:
+        """Заказы, выручка и средний чек по интервалам и статусам за дни [date_from, date_to)."""
+        query = (
+            select(SalesRollup.bucket, SalesRollup.status, SalesRollup.order_count, SalesRollup.revenue_rub)
+            .where(SalesRollup.period == period, *cls._date_range(SalesRollup.bucket, date_from, date_to),
+                   SalesRollup.order_count > 0)
+            .order_by(SalesRollup.bucket, SalesRollup.status)
+        )
+        if status is not None:
+            query = query.where(SalesRollup.status == status)
+        async with read_session() as session:
+            rows = (await session.execute(query)).all()
+        return [{"bucket": row.bucket, "status": row.status, "orders": row.order_count,
+                 "revenue_rub": round(row.revenue_rub, 2),
+                 "avg_basket_rub": round(row.revenue_rub / row.order_count, 2)} for row in rows]
+
+    @classmethod
+    async def get_category_sales(cls, period: str, date_from: date, date_to: date,
+                                 status: str | None = None) -> list[dict]:
+        """Позиции, штуки и выручка по интервалам, статусам и категориям за дни [date_from, date_to)."""
+        query = (
+            select(CategorySalesRollup.bucket, CategorySalesRollup.status, CategorySalesRollup.category,
+                   CategorySalesRollup.item_count, CategorySalesRollup.quantity, CategorySalesRollup.revenue_rub)
+            .where(CategorySalesRollup.period == period,
+                   *cls._date_range(CategorySalesRollup.bucket, date_from, date_to),
+                   CategorySalesRollup.item_count > 0)
+            .order_by(CategorySalesRollup.bucket, CategorySalesRollup.status, CategorySalesRollup.category)
+        )
+        if status is not None:
+            query = query.where(CategorySalesRollup.status == status)
+        async with read_session() as session:
+            rows = (await session.execute(query)).all()
+        return [{"bucket": row.bucket, "status": row.status, "category": row.category, "items": row.item_count,
+                 "quantity": row.quantity, "revenue_rub": round(row.revenue_rub, 2)} for row in rows]
+
+
+class BotStateDAO(BaseDAO):
+    model = BotState
+
+    @classmethod
+    async def get_value(cls, key: str) -> str | None:
+        """Возвращает служебное значение по ключу."""
+        async with read_session() as session:
+            return await session.scalar(select(cls.model.value).filter_by(key=key))
+
+    @classmethod
+    @writer_operation
+    async def set_value(cls, key: str, value: str) -> None:
+        """Сохраняет служебное значение одним INSERT ... ON CONFLICT."""
+        query = sqlite_insert(cls.model).values(key=key, value=value)
+        query = query.on_conflict_do_update(
+            index_elements=[cls.model.key],
+            set_={"value": query.excluded.value, "updated_at": func.now()},
+        )
+        async with unit_of_work() as session:
+            await session.execute(query)
+
+
+class UserSessionDAO(BaseDAO):
+    model = UserSession
+
+    @staticmethod
+    def _utc_now(seconds_ago: float = 0):
+        # expires_at по умолчанию ставится по UTC (datetime('now', '+1 hour')), сравниваем так же
+        return func.datetime('now', f'-{seconds_ago} seconds')
+
+    @classmethod
+    @writer_operation
+    async def expire_batch(cls, limit: int) -> int:
+        """Помечает до ``limit`` просроченных активных и завершённых сессий как expired."""
+        ids = (
+            select(cls.model.id_session)
+            .where(cls.model.status.in_(('active', 'completed')), cls.model.expires_at < cls._utc_now())
+            .limit(limit)
+        )
+        query = sqlalchemy_update(cls.model).where(cls.model.id_session.in_(ids)).values(status='expired')
+        async with unit_of_work() as session:
+            result = await session.execute(query)
+            return result.rowcount
+
+    @classmethod
+    @writer_operation
+    async def delete_expired_batch(cls, retention: float, limit: int) -> tuple[int, int]:
+        """
+        Удаляет до ``limit`` сессий, просроченных больше ``retention`` секунд назад.
+
+        Возвращает число удалённых строк и примерный объём освобождённых
+        данных в байтах (длина ``query`` и ``results_json``).
+        """
+        ids = (
+            select(cls.model.id_session)
+            .where(cls.model.status == 'expired', cls.model.expires_at < cls._utc_now(seconds_ago=retention))
+            .limit(limit)
+        )
+        size = func.length(cls.model.query) + func.coalesce(func.length(cls.model.results_json), 0)
+        query = sqlalchemy_delete(cls.model).where(cls.model.id_session.in_(ids)).returning(size)
+        async with unit_of_work() as session:
+            sizes = (await session.execute(query)).scalars().all()
+            return len(sizes), sum(sizes)
+
+    @classmethod
+    async def auto_vacuum_mode(cls) -> int:
+        """Режим ``PRAGMA auto_vacuum`` файла БД: 0 - NONE, 1 - FULL, 2 - INCREMENTAL."""
+        async with read_session() as session:
+            return await session.scalar(text("PRAGMA auto_vacuum"))
+
+    @classmethod
+    @writer_operation
+    async def incremental_vacuum(cls, pages: int) -> int | None:
+        """
+        Возвращает ОС до ``pages`` свободных страниц файла БД.
+
+        Работает только при ``auto_vacuum=INCREMENTAL``, иначе возвращает
+        None. Результат - число освобождённых страниц.
+        """
+        async with unit_of_work() as session:
+            if await session.scalar(text("PRAGMA auto_vacuum")) != 2:
+                return None
+            free = await session.scalar(text("PRAGMA freelist_count"))
+            # Драйвер sqlite3 делает один шаг прагмы, а каждый шаг освобождает
+            # одну страницу, поэтому прагма выполняется постранично
+            for _ in range(min(pages, free)):
+                await session.execute(text("PRAGMA incremental_vacuum(1)"))
+            return free - await session.scalar(text("PRAGMA freelist_count"))
+
+
+class AnalyticsDAO(BaseDAO):
+    model = Analytics
+
+    @classmethod
+    @writer_operation
+    async def insert_events(cls, rows: list[dict]) -> int:
+        """Записывает пачку событий одним executemany-INSERT, возвращает число записанных строк."""
+        query = insert(cls.model.__table__)
+        async with unit_of_work() as session:
+            result = await session.execute(query, rows)
+            return result.rowcount
+
+
+class BroadcastDAO(BaseDAO):
+    model = Broadcast
+
+    @classmethod
+    @writer_operation
+    async def create(cls, message_text: str) -> int:
+        """Создаёт рассылку и возвращает её id."""
+        async with unit_of_work() as session:
+            broadcast = cls.model(message_text=message_text)
+            session.add(broadcast)
+            await session.flush()
+            return broadcast.id_broadcast
+
+    @classmethod
+    @writer_operation
+    async def record_batch(cls, id_broadcast: int, deliveries: list[dict], last_user_id: int) -> None:
+        """Сохраняет результаты порции и сдвигает курсор рассылки одной транзакцией."""
+        counts = {"sent": 0, "failed": 0, "blocked": 0}
+        for delivery in deliveries:
+            counts[delivery["status"]] += 1
+        async with unit_of_work() as session:
+            if deliveries:
+                query = sqlite_insert(BroadcastDelivery).values(
+                    [dict(delivery, id_broadcast=id_broadcast) for delivery in deliveries]
+                ).on_conflict_do_nothing()
+                await session.execute(query)
+            await session.execute(
+                sqlalchemy_update(cls.model)
+                .where(cls.model.id_broadcast == id_broadcast)
+                .values(
+                    last_user_id=last_user_id,
+                    sent=cls.model.sent + counts["sent"],
+                    failed=cls.model.failed + counts["failed"],
+                    blocked=cls.model.blocked + counts["blocked"],
+                )
+            )
+
+    @classmethod
+    @writer_operation
+    async def finish(cls, id_broadcast: int, status: str = 'completed') -> None:
+        async with unit_of_work() as session:
+            await session.execute(
+                sqlalchemy_update(cls.model)
+                .where(cls.model.id_broadcast == id_broadcast)
+                .values(status=status, finished_at=func.now())
+            )
+
+
 '''class ApplicationDAO(BaseDAO):
     model = Application
 
@@ -0,0 +1,107 @@
+"""
+Обновление курса юаня по расписанию.
+
+Поставщик курса - любой объект с атрибутом ``name`` и корутиной
+``fetch() -> float``. ``ExchangeRateRefresher`` периодически опрашивает
+поставщика и записывает курс через ``ExchangeRateDAO.record`` только при
+изменении; кэш курса в памяти обновляется после коммита этой записи.
+Необязательный ``on_change`` вызывается после смены курса, например
+для пересчёта цен каталога.
+"""
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from app.api.dao import ExchangeRateDAO
+
+
+logger = logging.getLogger(__name__)
+
+
+class StaticRateProvider:
+    """Заглушка: всегда отдаёт заданный курс (для тестов и ручной настройки)."""
+
+    name = 'static'
+
+    def __init__(self, rate_rub: float):
+        self.rate_rub = rate_rub
+
+    async def fetch(self) -> float:
+        return self.rate_rub
+
+
+class FileRateProvider:
+    """
+    Читает курс из локального файла.
+
+    Файл содержит число (``12.7``) или JSON ``{"rate_rub": 12.7}``; его
+    может обновлять внешний cron-скрипт.
+    """
+
+    name = 'file'
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def fetch(self) -> float:
+        content = (await asyncio.to_thread(self.path.read_text, encoding='utf-8')).strip()
+        value = json.loads(content)
+        return float(value['rate_rub'] if isinstance(value, dict) else value)
+
+
+class ExchangeRateRefresher:
+    def __init__(self, provider, interval: float = 3600.0, tolerance: float = 1e-4,
+                 on_change: Callable[[], Awaitable[Any]] | None = None):
+        self.provider = provider
+        self.on_change = on_change
+        self.interval = interval
+        self.tolerance = tolerance
+        self._task: asyncio.Task | None = None
+        # Метрики
+        self.checks = 0
+        self.changes = 0
+        self.errors = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._refresh_loop(), name="exchange-rate-refresh")
+        logger.info("Обновление курса из %s раз в %s с", self.provider.name, self.interval)
+
+    async def refresh_once(self) -> bool:
+        """Запрашивает курс у поставщика и сохраняет его, если он изменился."""
+        self.checks += 1
+        rate = await self.provider.fetch()
+        if rate <= 0:
+            raise ValueError(f"Некорректный курс: {rate}")
+        if abs(rate - await ExchangeRateDAO.current_rate()) <= self.tolerance:
+            return False
+        await ExchangeRateDAO.record(rate, source=self.provider.name)
+        self.changes += 1
+        logger.info("Новый курс юаня: %s (%s)", rate, self.provider.name)
+        if self.on_change is not None:
+            await self.on_change()
+        return True
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Не удалось обновить курс юаня: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider.name,
+            "checks": self.checks,
+            "changes": self.changes,
+            "errors": self.errors,
+        }
@@ -0,0 +1,78 @@
+"""
+Кодирование выгрузки заказов в CSV или NDJSON потоком.
+
+Строки из ``OrderDAO.stream_export`` собираются в куски примерно по
+``chunk_size`` байт и отдаются ``StreamingResponse``; при ``compress``
+каждый кусок сразу сжимается gzip. В памяти держится не больше одного
+куска и одного заказа.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator
+
+from app.api.dao import OrderDAO
+
+
+ORDER_FIELDS = ('id_order', 'order_date', 'status', 'payment_status', 'total_amount_rub', 'exchange_rate_used',
+                'delivery_address', 'tracking_number', 'telegram_id', 'full_name', 'phone')
+ITEM_FIELDS = ('product_name', 'size', 'color', 'quantity', 'product_price_rub', 'subtotal')
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    raise TypeError(f"Не сериализуется в JSON: {type(value).__name__}")
+
+
+async def _csv_lines(rows) -> AsyncIterator[str]:
+    """CSV: одна строка на позицию заказа, поля заказа повторяются."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_FIELDS + ITEM_FIELDS)
+    async for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _ndjson_lines(rows) -> AsyncIterator[str]:
+    """NDJSON: один объект на заказ с вложенным списком позиций."""
+    order = None
+    async for row in rows:
+        if order is None or order['id_order'] != row.id_order:
+            if order is not None:
+                yield json.dumps(order, ensure_ascii=False, default=_json_default) + '\n'
+            order = {field: getattr(row, field) for field in ORDER_FIELDS} | {'items': []}
+        if row.product_name is not None:
+            order['items'].append({field: getattr(row, field) for field in ITEM_FIELDS})
+    if order is not None:
+        yield json.dumps(order, ensure_ascii=False, default=_json_default) + '\n'
+
+
+async def export_orders(fmt: str = 'csv', compress: bool = False, chunk_size: int = 64 * 1024,
+                        **filters) -> AsyncIterator[bytes]:
+    """Поток байтов выгрузки заказов; ``filters`` передаются в ``OrderDAO.stream_export``."""
+    rows = OrderDAO.stream_export(**filters)
+    lines = _csv_lines(rows) if fmt == 'csv' else _ndjson_lines(rows)
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    parts, size = [], 0
+    async for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size < chunk_size:
+            continue
+        chunk = ''.join(parts).encode('utf-8')
+        parts, size = [], 0
+        chunk = gzip.compress(chunk) if gzip else chunk
+        if chunk:
+            yield chunk
+    tail = ''.join(parts).encode('utf-8')
+    if gzip:
+        tail = gzip.compress(tail) + gzip.flush()
+    if tail:
+        yield tail
@@ -1,5 +1,6 @@
 from sqlalchemy import String, BigInteger, Integer, Date, Time, ForeignKey, Enum, Text, Float, Boolean, text, DateTime, \
-    CheckConstraint, UniqueConstraint
+    CheckConstraint, UniqueConstraint, Index
+from sqlalchemy import event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base, engine
 import enum
@@ -78,8 +79,12 @@ class UserSession(Base):
     results_json: Mapped[str] = mapped_column(Text, nullable=True)
     status: Mapped[str] = mapped_column(String, nullable=False, default='active')
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=text("datetime('now', 'localtime')"))
-    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=text("datetime('now', '+1 hour')"), index=True)
-    __table_args__=  (CheckConstraint("status IN ('active', 'completed', 'expired')"),)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=text("datetime('now', '+1 hour')"))
+    __table_args__=  (
+        CheckConstraint("status IN ('active', 'completed', 'expired')"),
+        # Очистка ищет просроченные сессии по статусу и сроку
+        Index('ix_user_sessions_status_expires_at', 'status', 'expires_at'),
+    )
 
     customer: Mapped[User] = relationship("User", back_populates="sessions")
 
@@ -91,7 +96,7 @@ class Cart(Base):
     id_customer: Mapped[int] = mapped_column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
     # В оригинальной схеме id_product был NOT NULL, что конфликтует с ON DELETE SET NULL.
     # Устанавливаем nullable=True, чтобы ON DELETE SET NULL работал корректно.
-    id_product: Mapped[int] = mapped_column(Integer, ForeignKey('products.id_product', ondelete='SET NULL'), nullable=True)
+    id_product: Mapped[int] = mapped_column(Integer, ForeignKey('products.id_product', ondelete='SET NULL'), nullable=True, index=True)
     size: Mapped[str] = mapped_column(String, nullable=True)
     color: Mapped[str] = mapped_column(String, nullable=True)
     quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
@@ -108,20 +113,24 @@ class Cart(Base):
 class Order(Base):
     __tablename__ = 'orders'
     id_order: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    id_customer: Mapped[int] = mapped_column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
+    id_customer: Mapped[int] = mapped_column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
     total_amount_rub: Mapped[float] = mapped_column(Float, nullable=False)
     currency: Mapped[str] = mapped_column(String, nullable=False, default='RUB')
     order_date: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=text("datetime('now', 'localtime')"), index=True)
-    status: Mapped[str] = mapped_column(String, nullable=False, default='pending', index=True)
+    status: Mapped[str] = mapped_column(String, nullable=False, default='pending')
     payment_status: Mapped[str] = mapped_column(String, nullable=False, default='unpaid', index=True)
-    payment_method: Mapped[str]
+    payment_method: Mapped[str] = mapped_column(String, nullable=True)
     delivery_address: Mapped[text] = mapped_column(Text, nullable=False)
-    tracking_number: Mapped[str]
+    tracking_number: Mapped[str] = mapped_column(String, nullable=True)
     admin_note: Mapped[str] = mapped_column(Text, nullable=True)
     exchange_rate_used: Mapped[float] = mapped_column(Float, nullable=False)
     __table_args__ = (
         CheckConstraint("status IN ('pending', 'confirmed', 'paid', 'processing_supplier', 'shipped', 'delivered', 'cancelled')"),
         CheckConstraint("payment_status IN ('unpaid', 'paid', 'refunded')"),
+        # История заказов клиента по дате; префикс id_customer служит и внешнему ключу
+        Index('ix_orders_id_customer_order_date', 'id_customer', 'order_date'),
+        # Выборки по статусу в порядке даты (админка, выгрузки)
+        Index('ix_orders_status_order_date', 'status', 'order_date'),
     )
 
     customer: Mapped["User"] = relationship("User", back_populates="orders")
@@ -133,7 +142,7 @@ class OrderItem(Base):
 
     id_item: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     id_order: Mapped[int] = mapped_column(Integer, ForeignKey('orders.id_order', ondelete='CASCADE'), nullable=False, index=True)
-    id_product: Mapped[int] = mapped_column(Integer, ForeignKey('products.id_product', ondelete='SET NULL'), nullable=True)
+    id_product: Mapped[int] = mapped_column(Integer, ForeignKey('products.id_product', ondelete='SET NULL'), nullable=True, index=True)
     product_name: Mapped[str] = mapped_column(String, nullable=False)
     product_price_rub: Mapped[float] = mapped_column(Float, nullable=False)
     size: Mapped[str] = mapped_column(String, nullable=True)
@@ -157,9 +166,225 @@ class ExchangeRate(Base):
 class Analytics(Base):
     __tablename__ = 'analytics'
 
+    # Суррогатный ключ: события разных воркеров могут совпасть по (key, recorded_at)
+    id_event: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    key: Mapped[str] = mapped_column(String, nullable=False)
+    value: Mapped[str] = mapped_column(Text, nullable=False)
+    recorded_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=text("datetime('now', 'localtime')"))
+
+    __table_args__ = (
+        Index('ix_analytics_key_recorded_at', 'key', 'recorded_at'),
+    )
+
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+
+    id_broadcast: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    message_text: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False, default='running')
+    # Курсор по users.user_id: все получатели до него уже обработаны
+    last_user_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sent: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=text("datetime('now', 'localtime')"))
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    __table_args__ = (CheckConstraint("status IN ('running', 'completed', 'cancelled')"),)
+
+    deliveries: Mapped[list["BroadcastDelivery"]] = relationship("BroadcastDelivery", back_populates="broadcast",
+                                                                 cascade="all, delete-orphan")
+
+
+class BroadcastDelivery(Base):
+    __tablename__ = 'broadcast_deliveries'
+
+    id_broadcast: Mapped[int] = mapped_column(Integer, ForeignKey('broadcasts.id_broadcast', ondelete='CASCADE'),
+                                              primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    status: Mapped[str] = mapped_column(String, nullable=False)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    __table_args__ = (CheckConstraint("status IN ('sent', 'failed', 'blocked')"),)
+
+    broadcast: Mapped["Broadcast"] = relationship("Broadcast", back_populates="deliveries")
+
+
+class BotState(Base):
+    """Служебные значения бота, которые должны переживать перезапуск."""
+    __tablename__ = 'bot_state'
+
     key: Mapped[str] = mapped_column(String, primary_key=True)
     value: Mapped[str] = mapped_column(Text, nullable=False)
-    recorded_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, server_default=text("datetime('now', 'localtime')"))
+
+
+class TableCounter(Base):
+    """Число строк в таблице; поддерживается триггерами SQLite вместо COUNT(*)."""
+    __tablename__ = 'table_counters'
+
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+# Таблицы, число строк которых ведётся в table_counters
+COUNTED_TABLES = ('users', 'orders')
+
+
+def counter_ddl(table: str) -> list[str]:
+    """Заводит счётчик строк таблицы текущим COUNT(*) и триггеры, меняющие его при вставке и удалении."""
+    return [
+        f"INSERT OR REPLACE INTO table_counters (table_name, row_count) SELECT '{table}', COUNT(*) FROM {table}",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table} BEGIN "
+        f"UPDATE table_counters SET row_count = row_count + 1 WHERE table_name = '{table}'; END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table} BEGIN "
+        f"UPDATE table_counters SET row_count = row_count - 1 WHERE table_name = '{table}'; END",
+    ]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_counters(target, connection, **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    for table in COUNTED_TABLES:
+        for statement in counter_ddl(table):
+            connection.exec_driver_sql(statement)
+
+
+class SalesRollup(Base):
+    """Заказы и выручка за час или день по статусу; ведётся триггерами на orders."""
+    __tablename__ = 'sales_rollups'
+
+    # 'hour' - bucket вида 'YYYY-MM-DD HH:00', 'day' - 'YYYY-MM-DD'
+    period: Mapped[str] = mapped_column(String, primary_key=True)
+    bucket: Mapped[str] = mapped_column(String, primary_key=True)
+    status: Mapped[str] = mapped_column(String, primary_key=True)
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    revenue_rub: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+
+class CategorySalesRollup(Base):
+    """Позиции и выручка за час или день по статусу заказа и категории товара."""
+    __tablename__ = 'category_sales_rollups'
+
+    period: Mapped[str] = mapped_column(String, primary_key=True)
+    bucket: Mapped[str] = mapped_column(String, primary_key=True)
+    status: Mapped[str] = mapped_column(String, primary_key=True)
+    # Пустая строка - товар без категории или удалённый товар
+    category: Mapped[str] = mapped_column(String, primary_key=True)
+    item_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    revenue_rub: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+
+# Периоды агрегатов: SQL-выражение начала интервала от даты заказа
+ROLLUP_PERIODS = {
+    'hour': "strftime('%Y-%m-%d %H:00', {})",
+    'day': "date({})",
+}
+
+
+def _sales_delta(row: str, sign: str) -> list[str]:
+    """Прибавляет (sign '+') или вычитает ('-') заказ row (NEW или OLD) в sales_rollups."""
+    statements = []
+    for period, bucket in ROLLUP_PERIODS.items():
+        statements.append(
+            f"INSERT INTO sales_rollups (period, bucket, status, order_count, revenue_rub) "
+            f"VALUES ('{period}', {bucket.format(f'{row}.order_date')}, {row}.status, {sign}1, {sign}{row}.total_amount_rub) "
+            f"ON CONFLICT (period, bucket, status) DO UPDATE SET order_count = order_count + excluded.order_count, "
+            f"revenue_rub = revenue_rub + excluded.revenue_rub")
+    return statements
+
+
+def _category_delta(delta: str, sign: str) -> list[str]:
+    """
+    Прибавляет к category_sales_rollups (или вычитает) строки подзапроса delta.
+
+    delta - шаблон SELECT с колонками bucket, status, category, item_count,
+    quantity, revenue; вместо {bucket} подставляется выражение периода.
+    """
+    statements = []
+    for period, bucket in ROLLUP_PERIODS.items():
+        source = delta.format(bucket=bucket.format("o.order_date"))
+        statements.append(
+            f"INSERT INTO category_sales_rollups (period, bucket, status, category, item_count, quantity, revenue_rub) "
+            f"SELECT '{period}', d.bucket, d.status, d.category, {sign}d.item_count, {sign}d.quantity, {sign}d.revenue "
+            f"FROM ({source}) AS d WHERE true "
+            f"ON CONFLICT (period, bucket, status, category) DO UPDATE SET "
+            f"item_count = item_count + excluded.item_count, quantity = quantity + excluded.quantity, "
+            f"revenue_rub = revenue_rub + excluded.revenue_rub")
+    return statements
+
+
+def _item_delta(row: str) -> str:
+    """Одна позиция заказа row (NEW или OLD) с датой и статусом её заказа."""
+    return (f"SELECT {{bucket}} AS bucket, o.status AS status, COALESCE(p.category, '') AS category, "
+            f"1 AS item_count, {row}.quantity AS quantity, {row}.subtotal AS revenue "
+            f"FROM orders AS o LEFT JOIN products AS p ON p.id_product = {row}.id_product "
+            f"WHERE o.id_order = {row}.id_order")
+
+
+def _order_items_delta(row: str) -> str:
+    """Все позиции заказа row (NEW или OLD) по категориям, с датой и статусом из row."""
+    return (f"SELECT {{bucket}} AS bucket, o.status AS status, COALESCE(p.category, '') AS category, "
+            f"COUNT(*) AS item_count, SUM(i.quantity) AS quantity, SUM(i.subtotal) AS revenue "
+            f"FROM (SELECT {row}.order_date AS order_date, {row}.status AS status) AS o "
+            f"JOIN order_items AS i ON i.id_order = {row}.id_order "
+            f"LEFT JOIN products AS p ON p.id_product = i.id_product GROUP BY 3")
+
+
+def _product_items_delta(row: str, category: str) -> str:
+    """Все продажи товара row (NEW или OLD) по интервалам и статусам с категорией category."""
+    return (f"SELECT {{bucket}} AS bucket, o.status AS status, COALESCE({category}, '') AS category, "
+            f"COUNT(*) AS item_count, SUM(i.quantity) AS quantity, SUM(i.subtotal) AS revenue "
+            f"FROM order_items AS i JOIN orders AS o ON o.id_order = i.id_order "
+            f"WHERE i.id_product = {row}.id_product GROUP BY 1, 2")
+
+
+def _trigger(name: str, timing: str, table: str, statements: list[str], when: str | None = None) -> str:
+    condition = f" WHEN {when}" if when else ""
+    return f"CREATE TRIGGER IF NOT EXISTS {name} {timing} ON {table}{condition} BEGIN {'; '.join(statements)}; END"
+
+
+def rollup_ddl() -> list[str]:
+    """
+    Триггеры, которые ведут sales_rollups и category_sales_rollups.
+
+    Позиции относятся к текущей категории товара и текущим дате и статусу
+    заказа, поэтому смена статуса, даты или категории переносит суммы из
+    одного интервала в другой. Итог всегда совпадает с пересборкой агрегатов
+    ``RollupDAO.rebuild_range``. Позиции удаляемого заказа вычитаются до
+    удаления, каскадное удаление позиций затем уже не находит заказ. Продажи
+    удаляемого товара так же заранее переносятся в пустую категорию: при
+    ON DELETE SET NULL товара в позиции уже нет.
+    """
+    return [
+        _trigger("orders_rollup_insert", "AFTER INSERT", "orders", _sales_delta("NEW", "+")),
+        _trigger("orders_rollup_delete", "BEFORE DELETE", "orders",
+                 _sales_delta("OLD", "-") + _category_delta(_order_items_delta("OLD"), "-")),
+        _trigger("orders_rollup_update", "AFTER UPDATE OF status, order_date, total_amount_rub", "orders",
+                 _sales_delta("OLD", "-") + _sales_delta("NEW", "+")),
+        _trigger("orders_rollup_move_items", "AFTER UPDATE OF status, order_date", "orders",
+                 _category_delta(_order_items_delta("OLD"), "-") + _category_delta(_order_items_delta("NEW"), "+")),
+        _trigger("order_items_rollup_insert", "AFTER INSERT", "order_items", _category_delta(_item_delta("NEW"), "+")),
+        _trigger("order_items_rollup_delete", "AFTER DELETE", "order_items", _category_delta(_item_delta("OLD"), "-")),
+        _trigger("order_items_rollup_update", "AFTER UPDATE OF id_order, id_product, quantity, subtotal", "order_items",
+                 _category_delta(_item_delta("OLD"), "-") + _category_delta(_item_delta("NEW"), "+")),
+        _trigger("products_rollup_category", "AFTER UPDATE OF category", "products",
+                 _category_delta(_product_items_delta("OLD", "OLD.category"), "-")
+                 + _category_delta(_product_items_delta("NEW", "NEW.category"), "+"),
+                 when="OLD.category IS NOT NEW.category"),
+        _trigger("products_rollup_delete", "BEFORE DELETE", "products",
+                 _category_delta(_product_items_delta("OLD", "OLD.category"), "-")
+                 + _category_delta(_product_items_delta("OLD", "NULL"), "+"),
+                 when="COALESCE(OLD.category, '') != ''"),
+    ]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_rollup_triggers(target, connection, **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in rollup_ddl():
+        connection.exec_driver_sql(statement)
 
 
 async def async_main():
@@ -0,0 +1,162 @@
+"""
+Пересчёт рублёвых цен товаров по текущему курсу юаня.
+
+Цена считается в SQL одним выражением от ``original_price_yuan``:
+``юани * курс * (1 + наценка %) + фиксированная наценка`` с округлением
+до шага. Таблица ``products`` обходится пачками по диапазонам
+``id_product``, каждая пачка - один UPDATE в собственной короткой
+транзакции, так что оформление заказов между пачками не ждёт. Меняются
+только строки, цена которых действительно изменится. В режиме
+``--dry-run`` ничего не записывается, печатается разница цен.
+
+Запуск: python -m app.api.repricing --dry-run
+        python -m app.api.repricing --markup-percent 15 --round-step 10 --round-mode up
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy import Integer, case, cast, func
+
+from app.api.dao import ExchangeRateDAO, ProductDAO
+from app.api.models import Product
+from app.config import settings
+from app.database import engine, read_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+class PricingFormula:
+    def __init__(self, markup_percent: float = 0.0, markup_fixed: float = 0.0,
+                 round_step: float = 1.0, round_mode: str = "nearest"):
+        if round_step <= 0:
+            raise ValueError("Шаг округления должен быть положительным.")
+        if round_mode not in ("nearest", "up"):
+            raise ValueError(f"Неизвестный режим округления: {round_mode}")
+        self.markup_percent = markup_percent
+        self.markup_fixed = markup_fixed
+        self.round_step = round_step
+        self.round_mode = round_mode
+
+    @classmethod
+    def from_settings(cls) -> "PricingFormula":
+        return cls(settings.REPRICE_MARKUP_PERCENT, settings.REPRICE_MARKUP_FIXED,
+                   settings.REPRICE_ROUND_STEP, settings.REPRICE_ROUND_MODE)
+
+    def expression(self, rate_rub: float):
+        """SQL-выражение новой цены товара при курсе ``rate_rub``."""
+        steps = (Product.original_price_yuan * (rate_rub * (1 + self.markup_percent / 100))
+                 + self.markup_fixed) / self.round_step
+        if self.round_mode == "up":
+            # В SQLite нет CEIL без расширения math: целая часть + 1, если есть дробная
+            whole = cast(steps, Integer)
+            rounded = whole + case((steps > whole, 1), else_=0)
+        else:
+            rounded = func.round(steps)
+        # Дешёвый товар при округлении к ближайшему дал бы 0 и нарушил CHECK price_rub > 0
+        return func.max(func.round(rounded * self.round_step, 2), round(self.round_step, 2))
+
+    def __repr__(self) -> str:
+        return (f"наценка {self.markup_percent}% + {self.markup_fixed} ₽, "
+                f"округление {self.round_mode} до {self.round_step} ₽")
+
+
+class RepricingJob:
+    def __init__(self, formula: PricingFormula, rate_rub: float | None = None,
+                 chunk_size: int = 2000, pause: float = 0.01, dry_run: bool = False, diff_limit: int = 20):
+        self.formula = formula
+        self.rate_rub = rate_rub
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.dry_run = dry_run
+        self.diff_limit = diff_limit
+        # Метрики и разница цен для dry-run
+        self.scanned = 0
+        self.changed = 0
+        self.chunks = 0
+        self.delta_total = 0.0
+        self.diff: list = []
+        self.elapsed = 0.0
+
+    async def run(self) -> dict:
+        started = time.perf_counter()
+        if self.rate_rub is None:
+            self.rate_rub = await ExchangeRateDAO.current_rate()
+        new_price = self.formula.expression(self.rate_rub)
+        first_id, last_id = await ProductDAO.id_bounds()
+        if first_id is not None:
+            after_id = first_id - 1
+            while after_id < last_id:
+                chunk_last = min(after_id + self.chunk_size, last_id)
+                if self.dry_run:
+                    rows = await ProductDAO.price_diff(after_id, chunk_last, new_price)
+                    self.changed += len(rows)
+                    self.delta_total += sum(row.new_price - row.price_rub for row in rows)
+                    self.diff.extend(rows[:self.diff_limit - len(self.diff)])
+                else:
+                    self.changed += await ProductDAO.reprice_range(after_id, chunk_last, new_price)
+                self.scanned += chunk_last - after_id
+                self.chunks += 1
+                after_id = chunk_last
+                # Даём место записям заказов между пачками
+                await asyncio.sleep(self.pause)
+        self.elapsed = time.perf_counter() - started
+        stats = self.stats()
+        logger.info("Пересчёт цен%s по курсу %s (%s): %s", " (dry-run)" if self.dry_run else "",
+                    self.rate_rub, self.formula, stats)
+        return stats
+
+    def stats(self) -> dict:
+        return {
+            "rate_rub": self.rate_rub,
+            "dry_run": self.dry_run,
+            "scanned_ids": self.scanned,
+            "changed": self.changed,
+            "chunks": self.chunks,
+            "delta_total_rub": round(self.delta_total, 2),
+            "elapsed_s": round(self.elapsed, 3),
+            # Скорость по реально изменённым строкам: диапазон id может быть разреженным
+            "changed_per_second": round(self.changed / self.elapsed) if self.elapsed else 0,
+        }
+
+
+async def reprice_catalog(**kwargs) -> dict:
+    """Пересчитывает цены всего каталога по текущему курсу и формуле из настроек."""
+    kwargs.setdefault("chunk_size", settings.REPRICE_CHUNK_SIZE)
+    return await RepricingJob(PricingFormula.from_settings(), **kwargs).run()
+
+
+async def _main(args) -> None:
+    formula = PricingFormula(args.markup_percent, args.markup_fixed, args.round_step, args.round_mode)
+    job = RepricingJob(formula, rate_rub=args.rate, chunk_size=args.chunk_size, pause=args.pause,
+                       dry_run=args.dry_run, diff_limit=args.show)
+    try:
+        stats = await job.run()
+        for row in job.diff:
+            print(f"{row.id_product:>8}  {row.price_rub:>10.2f} -> {row.new_price:>10.2f}  {row.name}")
+        print(stats)
+    finally:
+        await engine.dispose()
+        if read_engine is not engine:
+            await read_engine.dispose()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="только показать разницу цен")
+    parser.add_argument("--rate", type=float, help="курс юаня (по умолчанию - последний из БД)")
+    parser.add_argument("--markup-percent", type=float, default=settings.REPRICE_MARKUP_PERCENT)
+    parser.add_argument("--markup-fixed", type=float, default=settings.REPRICE_MARKUP_FIXED)
+    parser.add_argument("--round-step", type=float, default=settings.REPRICE_ROUND_STEP)
+    parser.add_argument("--round-mode", choices=["nearest", "up"], default=settings.REPRICE_ROUND_MODE)
+    parser.add_argument("--chunk-size", type=int, default=settings.REPRICE_CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=0.01, help="пауза между пачками, с")
+    parser.add_argument("--show", type=int, default=20, help="сколько изменений цен показать в dry-run")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
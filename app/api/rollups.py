@@ -0,0 +1,93 @@
+"""
+Пересборка агрегатов продаж ``sales_rollups`` и ``category_sales_rollups``.
+
+Обычно агрегаты ведут триггеры; пересборка нужна после включения
+агрегатов на существующей БД, ручных правок или для проверки. Заказы
+обходятся по ``order_date`` пачками по ``--chunk-days`` дней: каждая
+пачка - одна короткая транзакция, которая удаляет агрегаты этих дней и
+считает их заново из ``orders`` и ``order_items``. Между пачками
+оформление заказов не ждёт.
+
+Запуск: python -m app.api.rollups
+        python -m app.api.rollups --date-from 2025-01-01 --date-to 2025-02-01 --chunk-days 1
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, timedelta
+
+from app.api.dao import RollupDAO
+from app.database import engine, read_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+class RollupBackfill:
+    def __init__(self, date_from: date | None = None, date_to: date | None = None,
+                 chunk_days: int = 7, pause: float = 0.01):
+        if chunk_days < 1:
+            raise ValueError("Размер пачки должен быть не меньше одного дня.")
+        self.date_from = date_from
+        self.date_to = date_to
+        self.chunk_days = chunk_days
+        self.pause = pause
+        # Метрики
+        self.days = 0
+        self.chunks = 0
+        self.rows = 0
+        self.elapsed = 0.0
+
+    async def run(self) -> dict:
+        started = time.perf_counter()
+        first, last = await RollupDAO.order_date_bounds()
+        if first is not None:
+            day = self.date_from or first.date()
+            date_to = self.date_to or last.date() + timedelta(days=1)
+            while day < date_to:
+                chunk_end = min(day + timedelta(days=self.chunk_days), date_to)
+                counts = await RollupDAO.rebuild_range(day, chunk_end)
+                self.rows += counts["sales"] + counts["categories"]
+                self.days += (chunk_end - day).days
+                self.chunks += 1
+                day = chunk_end
+                # Даём место записям заказов между пачками
+                await asyncio.sleep(self.pause)
+        self.elapsed = time.perf_counter() - started
+        stats = self.stats()
+        logger.info("Пересборка агрегатов продаж: %s", stats)
+        return stats
+
+    def stats(self) -> dict:
+        return {
+            "days": self.days,
+            "chunks": self.chunks,
+            "rollup_rows": self.rows,
+            "elapsed_s": round(self.elapsed, 3),
+        }
+
+
+async def _main(args) -> None:
+    backfill = RollupBackfill(args.date_from, args.date_to, chunk_days=args.chunk_days, pause=args.pause)
+    try:
+        print(await backfill.run())
+    finally:
+        await engine.dispose()
+        if read_engine is not engine:
+            await read_engine.dispose()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date-from", type=date.fromisoformat, help="первый день (по умолчанию - первого заказа)")
+    parser.add_argument("--date-to", type=date.fromisoformat,
+                        help="день после последнего (по умолчанию - после последнего заказа)")
+    parser.add_argument("--chunk-days", type=int, default=7, help="сколько дней пересчитывать за транзакцию")
+    parser.add_argument("--pause", type=float, default=0.01, help="пауза между пачками, с")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from datetime import date, time
+from datetime import date, time, datetime
 
 
 # Модель для валидации данных
@@ -8,4 +8,31 @@ class AppointmentData(BaseModel):
     gender: str = Field(..., min_length=2, max_length=50, description="Пол клиента")
     appointment_date: date = Field(..., description="Дата назначения")  # Переименовал поле
     appointment_time: time = Field(..., description="Время назначения")  # Переименовал поле
-    user_id: int = Field(..., description="ID пользователя Telegram")
\ No newline at end of file
+    user_id: int = Field(..., description="ID пользователя Telegram")
+
+
+class OrderItemOut(BaseModel):
+    product_name: str
+    product_price_rub: float
+    size: str | None = None
+    color: str | None = None
+    quantity: int
+    subtotal: float
+
+
+class OrderOut(BaseModel):
+    id_order: int
+    order_date: datetime
+    status: str
+    payment_status: str
+    total_amount_rub: float
+    delivery_address: str
+    tracking_number: str | None = None
+    items: list[OrderItemOut]
+
+
+class OrderHistoryOut(BaseModel):
+    orders: list[OrderOut]
+    # Курсор следующей страницы: передать в before_date и before_id
+    next_before_date: datetime | None = None
+    next_before_id: int | None = None
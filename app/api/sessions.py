@@ -0,0 +1,118 @@
+"""
+Очистка просроченных сессий поиска ``user_sessions``.
+
+Проход очистки в два шага: активные и завершённые сессии с истёкшим
+``expires_at`` помечаются ``expired``, а помеченные сессии старше
+``retention`` секунд удаляются. Оба шага идут пачками по ``chunk_size``
+строк, каждая пачка - отдельная короткая транзакция с паузой после неё,
+так что очистка не держит блокировку записи подолгу.
+
+Если задан ``vacuum_pages``, после удаления до стольких свободных страниц
+файла возвращаются ОС через ``PRAGMA incremental_vacuum``, тоже пачками
+по ``chunk_size`` страниц. Для этого БД должна быть в режиме
+``auto_vacuum=INCREMENTAL``: новая БД создаётся в нём (``DB_AUTO_VACUUM``),
+существующую переводят один раз вручную: ``PRAGMA auto_vacuum=INCREMENTAL;
+VACUUM;``. Иначе ``start`` предупреждает в логе и отключает возврат страниц.
+"""
+import asyncio
+import logging
+import time
+
+from app.api.dao import UserSessionDAO
+
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper:
+    def __init__(self, interval: float = 300.0, retention: float = 86400.0, chunk_size: int = 500,
+                 pause: float = 0.01, vacuum_pages: int = 0):
+        self.interval = interval
+        self.retention = retention
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self._task: asyncio.Task | None = None
+        # Метрики
+        self.runs = 0
+        self.expired = 0
+        self.deleted = 0
+        self.bytes_reclaimed = 0
+        self.pages_vacuumed = 0
+        self.errors = 0
+        self.last_run_s = 0.0
+
+    async def start(self) -> None:
+        if self.vacuum_pages and await UserSessionDAO.auto_vacuum_mode() != 2:
+            logger.warning("БД не в режиме auto_vacuum=INCREMENTAL, incremental_vacuum отключён; "
+                           "чтобы включить, выполните один раз: PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+            self.vacuum_pages = 0
+        self._task = asyncio.create_task(self._sweep_loop(), name="session-sweep")
+
+    async def sweep_once(self) -> dict:
+        started = time.perf_counter()
+        self.runs += 1
+        expired = deleted = reclaimed = 0
+        while True:
+            count = await UserSessionDAO.expire_batch(self.chunk_size)
+            expired += count
+            self.expired += count
+            # Даём место другим записям между пачками
+            await asyncio.sleep(self.pause)
+            if count < self.chunk_size:
+                break
+        while True:
+            count, size = await UserSessionDAO.delete_expired_batch(self.retention, self.chunk_size)
+            deleted += count
+            reclaimed += size
+            self.deleted += count
+            self.bytes_reclaimed += size
+            await asyncio.sleep(self.pause)
+            if count < self.chunk_size:
+                break
+        pages = None
+        if self.vacuum_pages and deleted:
+            pages = 0
+            while pages < self.vacuum_pages:
+                limit = min(self.chunk_size, self.vacuum_pages - pages)
+                freed = await UserSessionDAO.incremental_vacuum(limit)
+                if freed is None:
+                    logger.warning("incremental_vacuum пропущен: БД не в режиме auto_vacuum=INCREMENTAL")
+                    pages = None
+                    break
+                pages += freed
+                self.pages_vacuumed += freed
+                await asyncio.sleep(self.pause)
+                if freed < limit:
+                    break
+        self.last_run_s = round(time.perf_counter() - started, 3)
+        result = {"expired": expired, "deleted": deleted, "bytes_reclaimed": reclaimed, "pages_vacuumed": pages}
+        if expired or deleted:
+            logger.info("Очистка сессий за %s с: %s", self.last_run_s, result)
+        return result
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Не удалось очистить просроченные сессии: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "expired": self.expired,
+            "deleted": self.deleted,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "pages_vacuumed": self.pages_vacuumed,
+            "errors": self.errors,
+            "last_run_s": self.last_run_s,
+        }
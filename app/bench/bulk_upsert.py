@@ -0,0 +1,71 @@
+"""
+Бенчмарк импорта каталога: ``add_many`` против ``bulk_upsert``.
+
+В чистой БД во временном каталоге ``--products`` товаров сначала
+вставляются через ORM (``ProductDAO.add_many``), затем в другую таблицу
+той же схемы - через ``bulk_upsert`` по ключу ``taobao_item_id``, после
+чего ``bulk_upsert`` повторяется с новыми ценами (только обновления).
+
+Запуск: python -m app.bench.bulk_upsert --products 50000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app import database
+from app.api.dao import ProductDAO
+from app.config import settings
+from app.dao.base import Base
+
+
+def product_rows(count: int, price_factor: float = 1.0) -> list[dict]:
+    return [{
+        "name": f"Кроссовки {number}",
+        "price_rub": round((1000 + number % 500) * price_factor, 2),
+        "original_price_yuan": 80.0 + number % 40,
+        "category": "обувь",
+        "taobao_url": f"https://item.taobao.com/item.htm?id={number}",
+        "taobao_item_id": str(number),
+    } for number in range(count)]
+
+
+async def timed(operation) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = await operation
+    return time.perf_counter() - started, result
+
+
+async def main_async(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="storechina-upsert-")
+    config = settings.model_copy(update={"DB_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}"})
+    engine = database.create_db_engine(config)
+    database.async_session_maker.configure(bind=engine)
+    database.read_session_maker.configure(bind=engine)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        elapsed, _ = await timed(ProductDAO.add_many(product_rows(args.products)))
+        print(f"add_many:            {args.products / elapsed:>10,.0f} строк/с")
+        await ProductDAO.delete(delete_all=True)
+
+        elapsed, result = await timed(ProductDAO.bulk_upsert(product_rows(args.products), ["taobao_item_id"]))
+        print(f"bulk_upsert (новые): {args.products / elapsed:>10,.0f} строк/с  {result}")
+        elapsed, result = await timed(ProductDAO.bulk_upsert(product_rows(args.products, 1.1), ["taobao_item_id"]))
+        print(f"bulk_upsert (цены):  {args.products / elapsed:>10,.0f} строк/с  {result}")
+    finally:
+        await engine.dispose()
+        database.async_session_maker.configure(bind=database.engine)
+        database.read_session_maker.configure(bind=database.read_engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50000, help="сколько товаров импортировать")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Принимает любые методы по адресу ``/bot<token>/<method>``, записывает
+вызовы и отвечает с искусственной задержкой. Бот направляется сюда через
+переменную окружения ``BOT_API_URL``.
+
+Запуск отдельно: python -m app.bench.fake_bot_api --port 8081 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, flood_every: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        # Каждый flood_every-й вызов отвечает 429, чтобы проверить обработку retry_after
+        self.flood_every = flood_every
+        self.calls: Counter[str] = Counter()
+        self.total = 0
+        self._message_id = 0
+        self.webhook = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+        self.app.router.add_get("/stats", self.stats)
+        self._runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        self.total += 1
+        data = await request.post()
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if self.flood_every and self.total % self.flood_every == 0:
+            return web.json_response(
+                {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                 "parameters": {"retry_after": 1}},
+                status=429,
+            )
+        return web.json_response({"ok": True, "result": self._result(method, data)})
+
+    def _result(self, method: str, data) -> object:
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "StoreChina", "username": "store_china_bot"}
+        if method == "getWebhookInfo":
+            return self.webhook
+        if method == "setWebhook":
+            self.webhook["url"] = data.get("url", "")
+            self.webhook["allowed_updates"] = json.loads(data.get("allowed_updates") or "[]")
+        if method == "deleteWebhook":
+            self.webhook = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        if method.startswith("send") or method.startswith("edit"):
+            self._message_id += 1
+            chat_id = int(data.get("chat_id", 0) or 0)
+            return {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": data.get("text", ""),
+            }
+        return True
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"total": self.total, "calls": dict(self.calls)})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def _serve(args) -> None:
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, flood_every=args.flood_every)
+    await api.start(args.host, args.port)
+    print(f"Fake Bot API: http://{args.host}:{args.port}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа, секунды")
+    parser.add_argument("--jitter", type=float, default=0.02, help="разброс задержки, секунды")
+    parser.add_argument("--flood-every", type=int, default=0, help="отвечать 429 на каждый N-й вызов")
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
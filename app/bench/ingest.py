@@ -0,0 +1,62 @@
+"""
+Бенчмарк разбора тела вебхука: сколько апдейтов в секунду проходит одно ядро.
+
+Сравнивает прежний путь (``json.loads`` + ``Update.model_validate``) с
+валидацией сырых байтов через ``Update.model_validate_json``.
+
+Запуск: python -m app.bench.ingest [--seconds 2]
+"""
+import argparse
+import json
+import time
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from app.bench.payloads import message_update, callback_update, web_app_data_update
+
+
+# Токен нужен только для создания Bot, запросов к API не будет
+bot = Bot(token="123456:bench-token")
+
+
+def dict_path(body: bytes) -> Update:
+    return Update.model_validate(json.loads(body), context={"bot": bot})
+
+
+def bytes_path(body: bytes) -> Update:
+    return Update.model_validate_json(body, context={"bot": bot})
+
+
+def measure(parse, body: bytes, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            parse(body)
+        count += 100
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="длительность замера на каждый случай")
+    args = parser.parse_args()
+
+    payloads = {
+        "message": message_update(1, 100500),
+        "callback": callback_update(2, 100500),
+        "web_app_data": web_app_data_update(3, 100500),
+    }
+    print(f"{'payload':<14}{'bytes':>7}{'dict upd/s':>14}{'bytes upd/s':>14}{'speedup':>9}")
+    for name, payload in payloads.items():
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        assert dict_path(body) == bytes_path(body)
+        old = measure(dict_path, body, args.seconds)
+        new = measure(bytes_path, body, args.seconds)
+        print(f"{name:<14}{len(body):>7}{old:>14,.0f}{new:>14,.0f}{new / old:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Нагрузочный тест вебхука.
+
+Поднимает заглушку Bot API (``app.bench.fake_bot_api``), запускает
+приложение через uvicorn во временном каталоге с чистой БД и шлёт на
+``/webhook`` тысячи синтетических апдейтов: ``/start`` и отправка
+контакта. Обработчика ``web_app_data`` в боте нет, поэтому оформление
+заказа идёт не через вебхук: каждый пользователь сохраняет заказ прямым
+вызовом ``OrderDAO.save_order_with_items`` в ту же БД, параллельно с
+обработкой апдейтов других пользователей. Заказ оформляется только после
+того, как приложение обработало контакт пользователя (в режиме queue
+вебхук отвечает раньше): иначе заказ регистрировал бы клиента до
+``/start`` и сценарий регистрации не выполнялся бы. Апдейты одного
+пользователя идут по порядку, разные пользователи - параллельно.
+
+В конце печатает p50/p95/p99 задержки ответа вебхука и оформления
+заказа, пропускную способность, коды ответов, число исходящих вызовов
+Bot API и ошибок "database is locked" из лога приложения и оформления.
+Если не все пользователи прошли регистрацию или сообщений отправлено
+меньше ожидаемого, прогон завершается с кодом 1.
+
+Запуск: python -m app.bench.loadtest --users 500 --concurrency 100 --mode queue
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import aiohttp
+
+from app import database
+from app.api.dao import OrderDAO, UserDAO
+from app.bench.fake_bot_api import FakeBotAPI
+from app.bench.payloads import message_update, contact_update, checkout_payload
+from app.bench.sqlite_profiles import ErrorCounter
+from app.config import settings
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Ответов бота на пользователя: приветствие и запрос телефона на /start,
+# благодарность и главное меню на контакт
+MESSAGES_PER_USER = 4
+
+
+def build_scenario(users: int) -> list[tuple[int, list[bytes]]]:
+    """Для каждого пользователя - его id и последовательность апдейтов: /start, контакт."""
+    update_id = 0
+    scenario = []
+    for user_id in range(100000, 100000 + users):
+        steps = []
+        for factory in (message_update, contact_update):
+            update_id += 1
+            steps.append(json.dumps(factory(update_id, user_id), ensure_ascii=False).encode())
+        scenario.append((user_id, steps))
+    return scenario
+
+
+async def run_user(http: aiohttp.ClientSession, url: str, user_id: int, steps: list[bytes],
+                   limit: asyncio.Semaphore, latencies: list[float], statuses: Counter,
+                   checkout_latencies: list[float], unregistered: list[int], timeout: float,
+                   acked_at: list[float]) -> None:
+    for body in steps:
+        async with limit:
+            started = time.perf_counter()
+            try:
+                async with http.post(url, data=body, headers={"Content-Type": "application/json"}) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+    acked_at.append(time.perf_counter())
+    if not await wait_registered(user_id, timeout):
+        unregistered.append(user_id)
+        return
+    async with limit:
+        started = time.perf_counter()
+        await OrderDAO.save_order_with_items(*checkout_payload(user_id))
+        checkout_latencies.append(time.perf_counter() - started)
+
+
+async def wait_registered(user_id: int, timeout: float) -> bool:
+    """Ждёт, пока приложение сохранит телефон пользователя, то есть обработает его контакт."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        user = await UserDAO.find_one_or_none(telegram_id=user_id)
+        if user is not None and user.phone:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def wait_ready(http: aiohttp.ClientSession, base: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f"{base}/metrics") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Приложение не запустилось")
+
+
+async def wait_drained(http: aiohttp.ClientSession, base: str, timeout: float = 60.0) -> dict:
+    """Ждёт, пока очередь апдейтов опустеет, и возвращает метрики приложения."""
+    deadline = time.monotonic() + timeout
+    while True:
+        async with http.get(f"{base}/metrics") as response:
+            metrics = await response.json()
+        queue = metrics.get("update_queue", {})
+        done = queue.get("processed", 0) + queue.get("failed", 0) >= queue.get("enqueued", 0)
+        if done or time.monotonic() > deadline:
+            return metrics
+        await asyncio.sleep(0.2)
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else 0.0
+
+
+async def run(args) -> int:
+    api = FakeBotAPI(latency=args.api_latency, jitter=args.api_jitter)
+    await api.start(port=args.api_port)
+    workdir = tempfile.mkdtemp(prefix="storechina-load-")
+    log_path = os.path.join(workdir, "app.log")
+    base = f"http://127.0.0.1:{args.app_port}"
+    db_url = f"sqlite+aiosqlite:///{os.path.join(workdir, 'db.sqlite3')}"
+    env = os.environ | {
+        "BOT_TOKEN": "123456:load-test-token",
+        "BASE_SITE": base,
+        "ADMIN_ID": "[1]",
+        "BOT_API_URL": f"http://127.0.0.1:{args.api_port}",
+        "WEBHOOK_MODE": args.mode,
+        "DB_URL": db_url,
+        "PYTHONPATH": ROOT,
+    }
+    # Оформление заказов пишет в БД приложения из этого процесса
+    engine = database.create_db_engine(settings.model_copy(update={"DB_URL": db_url}))
+    database.async_session_maker.configure(bind=engine)
+    database.read_session_maker.configure(bind=engine)
+    checkout_errors = ErrorCounter()
+    logging.getLogger("app").addHandler(checkout_errors)
+    logging.getLogger("app").setLevel(logging.ERROR)
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port), "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as http:
+            await wait_ready(http, base)
+            scenario = build_scenario(args.users)
+            limit = asyncio.Semaphore(args.concurrency)
+            latencies: list[float] = []
+            checkout_latencies: list[float] = []
+            unregistered: list[int] = []
+            acked_at: list[float] = []
+            statuses: Counter = Counter()
+            calls_before = api.total
+
+            started = time.perf_counter()
+            await asyncio.gather(*(run_user(http, f"{base}/webhook", user_id, steps, limit, latencies, statuses,
+                                            checkout_latencies, unregistered, args.register_timeout, acked_at)
+                                   for user_id, steps in scenario))
+            # Время до последнего ответа вебхука, без ожидания регистрации и заказов
+            acked = max(acked_at) - started
+            metrics = await wait_drained(http, base)
+            processed = time.perf_counter() - started
+    finally:
+        server.send_signal(subprocess.signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        await api.stop()
+        await engine.dispose()
+        database.async_session_maker.configure(bind=database.engine)
+        database.read_session_maker.configure(bind=database.read_engine)
+
+    with open(log_path) as log:
+        app_log = log.read()
+    total = len(latencies)
+    print(f"Режим вебхука:        {args.mode}")
+    print(f"Апдейтов отправлено:  {total} ({args.users} пользователей, параллельно {args.concurrency})")
+    print(f"Ответы вебхука:       {dict(statuses)}")
+    print(f"Задержка, мс:         p50={percentile(latencies, 50):.1f} "
+          f"p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f} max={max(latencies) * 1000:.1f}")
+    print(f"Оформление заказа (OrderDAO напрямую, не через вебхук), мс: "
+          f"p50={percentile(checkout_latencies, 50):.1f} p95={percentile(checkout_latencies, 95):.1f} "
+          f"p99={percentile(checkout_latencies, 99):.1f}, ошибок {checkout_errors.errors}, "
+          f"'database is locked' {checkout_errors.locked}")
+    print(f"Пропускная способность: {total / acked:.0f} апд/с по ответам, {total / processed:.0f} апд/с до обработки")
+    print(f"Вызовов Bot API:      {api.total - calls_before} {dict(api.calls)}")
+    print(f"Ошибок 'database is locked': {app_log.count('database is locked')}")
+    print(f"Метрики приложения:   {json.dumps(metrics, ensure_ascii=False)}")
+    print(f"Лог приложения:       {log_path}")
+    sent = api.calls.get("sendMessage", 0)
+    expected = args.users * MESSAGES_PER_USER
+    if unregistered or sent < expected:
+        print(f"ОШИБКА: не зарегистрировано пользователей {len(unregistered)}, "
+              f"sendMessage {sent} из ожидаемых {expected} - сценарий выполнен не полностью")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500,
+                        help="число синтетических пользователей (по 2 апдейта и заказу)")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных запросов к вебхуку")
+    parser.add_argument("--mode", choices=("inline", "queue"), default="queue", help="WEBHOOK_MODE приложения")
+    parser.add_argument("--app-port", type=int, default=8090)
+    parser.add_argument("--api-port", type=int, default=8091)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="задержка заглушки Bot API, секунды")
+    parser.add_argument("--api-jitter", type=float, default=0.02)
+    parser.add_argument("--register-timeout", type=float, default=60.0,
+                        help="сколько ждать обработки контакта пользователя перед заказом, секунды")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
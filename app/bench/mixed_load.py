@@ -0,0 +1,96 @@
+"""
+Бенчмарк смешанной нагрузки: оформление заказов и тяжёлые чтения одновременно.
+
+Писатели в цикле сохраняют заказы через ``OrderDAO.save_order_with_items``,
+читатели - ``OrderDAO.get_recent(100)`` и ``StatsDAO.get_stats()``.
+Замер выполняется дважды: когда чтения делят пул соединений с записями
+и когда идут через отдельный пул читателей (``read_session_maker``).
+Печатаются пропускная способность и p50/p95/p99 задержки чтений.
+
+Запуск: python -m app.bench.mixed_load --seconds 10 --writers 30 --readers 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from app import database
+from app.api.dao import OrderDAO, StatsDAO, UserDAO
+from app.bench.sqlite_profiles import ErrorCounter, order_payload
+from app.config import settings
+from app.dao.base import Base
+
+
+async def run_mode(name: str, separate_readers: bool, args, errors: ErrorCounter) -> None:
+    workdir = tempfile.mkdtemp(prefix=f"storechina-mixed-{name}-")
+    config = settings.model_copy(update={"DB_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}"})
+    write_engine = database.create_db_engine(config)
+    read_engine = database.create_db_engine(config, read_only=True) if separate_readers else write_engine
+    database.async_session_maker.configure(bind=write_engine)
+    database.read_session_maker.configure(bind=read_engine)
+    try:
+        async with write_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await UserDAO.add_many([{"telegram_id": 500000 + i, "full_name": f"Тест {i}"} for i in range(200)])
+        for number in range(args.seed_orders):
+            await OrderDAO.save_order_with_items(*order_payload(number))
+
+        errors.errors = errors.locked = 0
+        deadline = time.monotonic() + args.seconds
+        writes = 0
+        read_latencies: list[float] = []
+
+        async def writer():
+            nonlocal writes
+            number = 0
+            while time.monotonic() < deadline:
+                await OrderDAO.save_order_with_items(*order_payload(number))
+                writes += 1
+                number += 1
+
+        async def reader(index: int):
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                if index % 2:
+                    await StatsDAO.get_stats()
+                else:
+                    await OrderDAO.get_recent(limit=100)
+                read_latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(writer() for _ in range(args.writers)),
+                             *(reader(i) for i in range(args.readers)))
+        quantiles = statistics.quantiles(read_latencies, n=100)
+        print(f"{name:<10}{writes / args.seconds:>10,.0f}{len(read_latencies) / args.seconds:>10,.0f}"
+              f"{quantiles[49] * 1000:>9.1f}{quantiles[94] * 1000:>9.1f}{quantiles[98] * 1000:>9.1f}"
+              f"{errors.errors:>8}")
+    finally:
+        await write_engine.dispose()
+        if separate_readers:
+            await read_engine.dispose()
+
+
+async def main_async(args) -> None:
+    errors = ErrorCounter()
+    logging.getLogger("app").addHandler(errors)
+    logging.getLogger("app").setLevel(logging.ERROR)
+    print(f"{'readers':<10}{'orders/s':>10}{'reads/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    await run_mode("shared", False, args, errors)
+    await run_mode("separate", True, args, errors)
+    database.async_session_maker.configure(bind=database.engine)
+    database.read_session_maker.configure(bind=database.read_engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="длительность каждого замера")
+    parser.add_argument("--writers", type=int, default=30, help="параллельных писателей")
+    parser.add_argument("--readers", type=int, default=10, help="параллельных читателей")
+    parser.add_argument("--seed-orders", type=int, default=2000, help="заказов в БД перед замером")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
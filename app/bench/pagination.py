@@ -0,0 +1,73 @@
+"""
+Бенчмарк пагинации: OFFSET против keyset и полный обход таблицы порциями.
+
+В чистую БД во временном каталоге загружается ``--users`` клиентов, затем
+замеряется время чтения страницы на разной глубине через ``paginate``
+(OFFSET) и ``paginate_keyset``, а также полный обход ``users`` через
+``iter_batches`` с пиковым размером порции в памяти.
+
+Запуск: python -m app.bench.pagination --users 200000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app import database
+from app.api.dao import UserDAO
+from app.config import settings
+from app.dao.base import Base
+
+
+async def timed(operation) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = await operation
+    return (time.perf_counter() - started) * 1000, result
+
+
+async def main_async(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="storechina-pages-")
+    config = settings.model_copy(update={"DB_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}"})
+    engine = database.create_db_engine(config)
+    database.async_session_maker.configure(bind=engine)
+    database.read_session_maker.configure(bind=engine)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await UserDAO.bulk_upsert([{"telegram_id": 10 ** 9 + number, "full_name": f"Клиент {number}"}
+                                   for number in range(args.users)], ["telegram_id"])
+
+        await UserDAO.paginate_keyset(limit=1)  # прогрев пула и кэша страниц
+        print(f"{'страница':>10}{'OFFSET мс':>12}{'keyset мс':>12}")
+        for depth in (0.0, 0.5, 0.99):
+            page = int(args.users * depth) // args.page_size + 1
+            offset_ms, _ = await timed(UserDAO.paginate(page=page, page_size=args.page_size))
+            # Курсор страницы - первичный ключ последней записи предыдущей страницы
+            keyset_ms, _ = await timed(UserDAO.paginate_keyset(after=(page - 1) * args.page_size,
+                                                               limit=args.page_size))
+            print(f"{page:>10}{offset_ms:>12.2f}{keyset_ms:>12.2f}")
+
+        started = time.perf_counter()
+        rows = largest = 0
+        async for batch in UserDAO.iter_batches(batch_size=args.batch_size, columns=["user_id", "telegram_id"]):
+            rows += len(batch)
+            largest = max(largest, len(batch))
+        elapsed = time.perf_counter() - started
+        print(f"iter_batches: {rows:,} строк за {elapsed:.2f} с ({rows / elapsed:,.0f} строк/с), порция до {largest}")
+    finally:
+        await engine.dispose()
+        database.async_session_maker.configure(bind=database.engine)
+        database.read_session_maker.configure(bind=database.read_engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200000, help="сколько клиентов загрузить")
+    parser.add_argument("--page-size", type=int, default=50, help="размер страницы")
+    parser.add_argument("--batch-size", type=int, default=1000, help="размер порции iter_batches")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
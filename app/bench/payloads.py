@@ -0,0 +1,75 @@
+"""Типовые апдейты Telegram для бенчмарков и нагрузочных тестов."""
+import json
+import time
+
+
+def message_update(update_id: int, user_id: int, text: str = "/start") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Тест", "username": f"user{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Тест", "last_name": "Покупатель",
+                     "username": f"user{user_id}", "language_code": "ru"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else [],
+        },
+    }
+
+
+def contact_update(update_id: int, user_id: int) -> dict:
+    update = message_update(update_id, user_id)
+    message = update["message"]
+    del message["text"], message["entities"]
+    message["contact"] = {"phone_number": f"+7900{user_id % 10000000:07d}", "first_name": "Тест", "user_id": user_id}
+    return update
+
+
+def callback_update(update_id: int, user_id: int, data: str = "back_home") -> dict:
+    message = message_update(update_id, user_id, text="Чем я могу помочь вам сегодня?")["message"]
+    message["from"] = {"id": 1, "is_bot": True, "first_name": "StoreChina"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": message["chat"] | {"is_bot": False},
+            "chat_instance": str(user_id),
+            "message": message,
+            "data": data,
+        },
+    }
+
+
+def checkout_payload(user_id: int, items: int = 3) -> tuple[dict, dict]:
+    """Данные оформления заказа для ``OrderDAO.save_order_with_items``: клиент и заказ без товаров каталога."""
+    user_info = {"id": user_id, "first_name": "Тест", "last_name": "Покупатель", "address": "Москва"}
+    order = {
+        "total": 1490.0 * items,
+        "timestamp": "2025-09-01 12:00:00",
+        "items": [{"id_product": None, "name": f"Кроссовки {i}", "price": 1490.0,
+                   "size": "42", "color": "белый", "quantity": 1} for i in range(items)],
+    }
+    return user_info, order
+
+
+def web_app_data_update(update_id: int, user_id: int, items: int = 3) -> dict:
+    update = message_update(update_id, user_id)
+    message = update["message"]
+    del message["text"], message["entities"]
+    order = {
+        "total": 1490.0 * items,
+        "timestamp": "2025-09-01 12:00:00",
+        "items": [{"id_product": i + 1, "name": f"Кроссовки {i}", "price": 1490.0,
+                   "size": "42", "color": "белый", "quantity": 1} for i in range(items)],
+    }
+    message["web_app_data"] = {"data": json.dumps(order, ensure_ascii=False), "button_text": "Оформить заказ"}
+    return update
+
+
+PAYLOADS = {
+    "message": message_update,
+    "contact": contact_update,
+    "callback": callback_update,
+    "web_app_data": web_app_data_update,
+}
@@ -0,0 +1,258 @@
+"""
+Проверка планов запросов DAO: ни полных сканирований, ни сортировок во временном B-дереве.
+
+В чистую БД во временном каталоге загружаются ``--users`` клиентов,
+``--orders`` заказов с позициями и ``--products`` товаров, затем
+вызываются методы ``BaseDAO`` и DAO из ``app.api.dao``. Все выполненные
+ими SQL-запросы перехватываются и прогоняются через ``EXPLAIN QUERY
+PLAN``. Запрос считается регрессией, если в плане есть ``SCAN`` таблицы
+или ``USE TEMP B-TREE``, кроме намеренных случаев из ``ALLOWED``. Проход
+по индексу в порядке сортировки (``SCAN ... USING INDEX``) допустим,
+только если запрос ограничен ``LIMIT``.
+Отдельно проверяется, что у каждого внешнего ключа есть индекс: иначе
+каскадное удаление родителя сканирует дочернюю таблицу.
+
+Для каждой регрессии печатается план и подсказка с составным индексом.
+Код возврата 1, если найдены регрессии, - скрипт можно запускать в CI.
+
+Запуск: python -m app.bench.query_plans --users 20000 --orders 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, insert
+
+from app import database
+from app.api.dao import (UserDAO, ProductDAO, ExchangeRateDAO, OrderDAO, StatsDAO, RollupDAO, BotStateDAO,
+                         BroadcastDAO, UserSessionDAO, AnalyticsDAO, user_cache, order_history_cache)
+from app.api.models import Order, OrderItem
+from app.api.repricing import PricingFormula
+from app.bench.bulk_upsert import product_rows
+from app.config import settings
+from app.dao.base import Base
+
+
+# Намеренные полные проходы: метка сценария -> причина
+ALLOWED = {
+    "BaseDAO.find_all без фильтра": "выгрузка всей таблицы",
+    "BaseDAO.count без фильтра": "точный COUNT(*) по запросу",
+    "BaseDAO.paginate": "OFFSET-пагинация, для больших таблиц есть paginate_keyset",
+    "StatsDAO.reconcile": "сверка счётчиков с COUNT(*) раз в час",
+    "RollupDAO.rebuild_range": "пересборка агрегатов: группировка заказов за несколько дней",
+    "RollupDAO.get_category_sales": "фильтр по статусу после диапазона интервалов: досортировка строк отчёта",
+    "OrderDAO.stream_export без фильтра": "полная выгрузка потоком: проход всей таблицы по индексу даты",
+}
+
+STATUSES = ('pending', 'confirmed', 'paid', 'shipped', 'delivered', 'cancelled')
+
+
+async def seed(args) -> None:
+    await UserDAO.register_many([{"telegram_id": 10 ** 9 + number, "first_name": f"Клиент {number}"}
+                                 for number in range(args.users)])
+    await ProductDAO.import_catalog(product_rows(args.products))
+    # Товар, который без нижней границы цены округлился бы до 0 ₽
+    await ProductDAO.import_catalog([{"name": "Наклейка", "price_rub": 1.0, "original_price_yuan": 0.03,
+                                      "category": "мелочи", "taobao_url": "https://item.taobao.com/item.htm?id=cheap",
+                                      "taobao_item_id": "cheap"}])
+    rng = random.Random(1)
+    start = datetime(2025, 1, 1)
+    orders = [{
+        "id_order": number + 1,
+        "id_customer": rng.randint(1, args.users),
+        "total_amount_rub": 1000.0,
+        "order_date": start + timedelta(minutes=number),
+        "status": rng.choice(STATUSES),
+        "delivery_address": "Москва",
+        "exchange_rate_used": 12.5,
+    } for number in range(args.orders)]
+    items = [{"id_order": order["id_order"], "id_product": rng.randint(1, args.products),
+              "product_name": "Кроссовки", "product_price_rub": 500.0, "quantity": 2, "subtotal": 1000.0}
+             for order in orders for _ in range(2)]
+    async with database.unit_of_work() as session:
+        for rows, table in ((orders, Order.__table__), (items, OrderItem.__table__)):
+            for chunk in range(0, len(rows), 10000):
+                await session.execute(insert(table), rows[chunk:chunk + 10000])
+    await StatsDAO.reconcile()
+
+
+async def drain(rows) -> None:
+    """Дочитывает асинхронный генератор строк до конца."""
+    async for _ in rows:
+        pass
+
+
+def scenarios(args) -> list[tuple[str, object]]:
+    """Сценарии: метка и фабрика корутины с вызовом DAO."""
+    telegram_id = 10 ** 9 + args.users // 2
+    new_price = PricingFormula(15, 0, 10, "up").expression(13.0)
+    return [
+        ("BaseDAO.find_one_or_none_by_id", lambda: OrderDAO.find_one_or_none_by_id(args.orders // 2)),
+        ("BaseDAO.find_one_or_none", lambda: UserDAO.find_one_or_none(telegram_id=telegram_id)),
+        ("BaseDAO.find_all по внешнему ключу", lambda: OrderDAO.find_all(id_customer=7)),
+        ("BaseDAO.find_all без фильтра", lambda: BroadcastDAO.find_all()),
+        ("BaseDAO.count без фильтра", lambda: ProductDAO.count()),
+        ("BaseDAO.count по статусу", lambda: OrderDAO.count(status='paid')),
+        ("BaseDAO.exists", lambda: UserDAO.exists(telegram_id=telegram_id)),
+        ("BaseDAO.paginate", lambda: UserDAO.paginate(page=10, page_size=50)),
+        ("BaseDAO.paginate_keyset по первичному ключу", lambda: UserDAO.paginate_keyset(after=1000, limit=100)),
+        ("BaseDAO.paginate_keyset по дате со статусом",
+         lambda: OrderDAO.paginate_keyset(after=(datetime(2025, 2, 1), 0), limit=100, order_by='order_date',
+                                          status='paid')),
+        ("BaseDAO.paginate_keyset по дате", lambda: OrderDAO.paginate_keyset(limit=100, order_by='order_date')),
+        ("BaseDAO.update", lambda: OrderDAO.update({"id_order": 5}, admin_note="проверка")),
+        ("BaseDAO.delete", lambda: OrderDAO.delete(id_order=args.orders)),
+        ("BaseDAO.bulk_upsert", lambda: ProductDAO.import_catalog(product_rows(50))),
+        ("UserDAO.register_or_update", lambda: UserDAO.register_or_update(telegram_id, phone="+79990000000")),
+        ("UserDAO.get_cached", lambda: UserDAO.get_cached(telegram_id + 1)),
+        ("ProductDAO.id_bounds", lambda: ProductDAO.id_bounds()),
+        ("ProductDAO.price_diff", lambda: ProductDAO.price_diff(0, 2000, new_price)),
+        ("ProductDAO.reprice_range", lambda: ProductDAO.reprice_range(0, 2000, new_price)),
+        ("ProductDAO.reprice_range с округлением к ближайшему",
+         lambda: ProductDAO.reprice_range(0, args.products + 1, PricingFormula(round_step=1).expression(12.5))),
+        ("ExchangeRateDAO.reload", lambda: ExchangeRateDAO.reload()),
+        ("OrderDAO.save_order_with_items",
+         lambda: OrderDAO.save_order_with_items({"id": telegram_id, "address": "Москва"},
+                                                {"total": 1000.0, "items": [{"name": "Кроссовки", "price": 500.0,
+                                                                             "quantity": 2}]})),
+        ("OrderDAO.get_history", lambda: OrderDAO.get_history(telegram_id, limit=20)),
+        ("OrderDAO.get_history, следующая страница",
+         lambda: OrderDAO.get_history(telegram_id, limit=20, before=(datetime(2025, 3, 1), 10 ** 9))),
+        ("OrderDAO.get_recent", lambda: OrderDAO.get_recent(limit=50)),
+        ("OrderDAO.stream_export без фильтра", lambda: drain(OrderDAO.stream_export())),
+        ("OrderDAO.stream_export за месяц",
+         lambda: drain(OrderDAO.stream_export(date_from=datetime(2025, 1, 1), date_to=datetime(2025, 2, 1)))),
+        ("StatsDAO.get_stats", lambda: StatsDAO.get_stats()),
+        ("StatsDAO.reconcile", lambda: StatsDAO.reconcile()),
+        ("RollupDAO.order_date_bounds", lambda: RollupDAO.order_date_bounds()),
+        ("RollupDAO.get_sales", lambda: RollupDAO.get_sales('day', date(2025, 1, 1), date(2025, 2, 1))),
+        ("RollupDAO.get_category_sales",
+         lambda: RollupDAO.get_category_sales('hour', date(2025, 1, 10), date(2025, 1, 11), status='paid')),
+        ("RollupDAO.rebuild_range", lambda: RollupDAO.rebuild_range(date(2025, 1, 10), date(2025, 1, 11))),
+        ("UserSessionDAO.expire_batch", lambda: UserSessionDAO.expire_batch(500)),
+        ("UserSessionDAO.delete_expired_batch", lambda: UserSessionDAO.delete_expired_batch(86400, 500)),
+        ("AnalyticsDAO.insert_events",
+         lambda: AnalyticsDAO.insert_events([{"key": "search", "value": '{"query": "кроссовки"}',
+                                              "recorded_at": datetime(2025, 1, 10, 12)} for _ in range(100)])),
+        ("BotStateDAO.set_value", lambda: BotStateDAO.set_value("last_update_id", "42")),
+        ("BotStateDAO.get_value", lambda: BotStateDAO.get_value("last_update_id")),
+        ("BroadcastDAO.create", lambda: BroadcastDAO.create("Проверка")),
+
+        ("BroadcastDAO.record_batch",
+         lambda: BroadcastDAO.record_batch(1, [{"user_id": 1, "status": "sent"}], last_user_id=1)),
+        ("BroadcastDAO.finish", lambda: BroadcastDAO.finish(1)),
+    ]
+
+
+def plan_problems(sql: str, plan: list[str]) -> list[str]:
+    limited = re.search(r"\bLIMIT\b", sql) is not None
+    problems = []
+    for detail in plan:
+        if "USE TEMP B-TREE" in detail:
+            problems.append(detail)
+        elif detail.startswith("SCAN ") and not detail.startswith("SCAN CONSTANT ROW"):
+            # Упорядоченный проход по индексу с LIMIT читает только нужные строки
+            if not (limited and " USING " in detail and "INDEX" in detail):
+                problems.append(detail)
+    return problems
+
+
+def suggest_index(sql: str, plan: list[str]) -> str:
+    """Подсказка по плану: колонки равенства из WHERE, затем колонки сортировки."""
+    table_match = re.search(r"(?:SCAN|SEARCH) (\w+)", " ".join(plan))
+    if not table_match:
+        return "перепишите запрос так, чтобы сортировка совпадала с индексом"
+    table = table_match.group(1)
+    equality = re.findall(rf"\b{table}\.(\w+) = \?", sql)
+    order_by = re.search(r"ORDER BY (.+?)(?: LIMIT| OFFSET|$)", sql, re.S)
+    ordering = [column for column in re.findall(rf"\b{table}\.(\w+)", order_by.group(1))] if order_by else []
+    # Целочисленный первичный ключ - это rowid, он и так есть в конце любого индекса
+    rowid = [column.name for column in Base.metadata.tables[table].primary_key.columns]
+    columns = [column for column in dict.fromkeys(equality + ordering) if rowid != [column]]
+    if not columns:
+        return f"запрос читает всю таблицу {table}: добавьте условие по индексированной колонке"
+    return f"CREATE INDEX ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+
+
+def unindexed_foreign_keys() -> list[str]:
+    """Внешние ключи, по которым нет индекса с этой колонкой в начале."""
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        leading = {index.columns[0].name for index in table.indexes}
+        leading |= {column.name for column in table.primary_key.columns[:1]}
+        for fk in table.foreign_keys:
+            if fk.parent.name not in leading:
+                missing.append(f"{table.name}.{fk.parent.name} -> {fk.target_fullname}")
+    return missing
+
+
+async def main_async(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="storechina-plans-")
+    config = settings.model_copy(update={"DB_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}"})
+    engine = database.create_db_engine(config)
+    database.async_session_maker.configure(bind=engine)
+    database.read_session_maker.configure(bind=engine)
+    captured: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        # Управление транзакциями и точками сохранения не проверяем
+        if not statement.lstrip().upper().startswith(("EXPLAIN", "PRAGMA", "BEGIN", "SAVEPOINT", "RELEASE",
+                                                      "ROLLBACK")):
+            captured.append((statement, parameters[0] if executemany else parameters))
+
+    failures = 0
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await seed(args)
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        for label, make_call in scenarios(args):
+            user_cache.clear()
+            order_history_cache.clear()
+            captured.clear()
+            await make_call()
+            statements = list(captured)
+            label_failures = failures
+            async with engine.connect() as conn:
+                for sql, parameters in statements:
+                    rows = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parameters)).all()
+                    plan = [row[-1] for row in rows]
+                    problems = plan_problems(sql, plan)
+                    if not problems:
+                        continue
+                    if label in ALLOWED:
+                        print(f"[допустимо] {label}: {'; '.join(problems)} ({ALLOWED[label]})")
+                        continue
+                    failures += 1
+                    print(f"[РЕГРЕССИЯ] {label}")
+                    print(f"    SQL:  {' '.join(sql.split())}")
+                    print(f"    план: {' | '.join(plan)}")
+                    print(f"    совет: {suggest_index(sql, plan)}")
+            if failures == label_failures:
+                print(f"[ok] {label}: запросов {len(statements)}")
+        for fk in unindexed_foreign_keys():
+            failures += 1
+            print(f"[РЕГРЕССИЯ] внешний ключ без индекса: {fk}")
+    finally:
+        await engine.dispose()
+        database.async_session_maker.configure(bind=database.engine)
+        database.read_session_maker.configure(bind=database.read_engine)
+    print(f"Регрессий: {failures}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000, help="сколько клиентов загрузить")
+    parser.add_argument("--orders", type=int, default=100000, help="сколько заказов загрузить")
+    parser.add_argument("--products", type=int, default=20000, help="сколько товаров загрузить")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
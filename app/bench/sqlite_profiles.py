@@ -0,0 +1,126 @@
+"""
+Бенчмарк профилей SQLite: запись заказов и чтение последних заказов.
+
+Для каждого профиля создаётся чистая БД во временном каталоге, затем
+``--writers`` корутин параллельно сохраняют заказы через
+``OrderDAO.save_order_with_items``, после чего ``--readers`` корутин
+читают ``OrderDAO.get_recent``. Печатаются операции в секунду и число
+ошибок записи, в том числе "database is locked". С ``--single-writer`` запись идёт через
+очередь одного писателя с групповым коммитом (``app.dao.writer``).
+
+Запуск: python -m app.bench.sqlite_profiles --orders 2000 --writers 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from app import database
+from app.api.dao import OrderDAO, UserDAO
+from app.config import settings
+from app.dao import writer
+from app.dao.base import Base
+
+
+PROFILES = {
+    # Настройки SQLite по умолчанию
+    "default": dict(DB_JOURNAL_MODE="DELETE", DB_SYNCHRONOUS="FULL", DB_CACHE_SIZE=-2000,
+                    DB_MMAP_SIZE=0, DB_AUTO_VACUUM="NONE"),
+    "wal-full": dict(DB_JOURNAL_MODE="WAL", DB_SYNCHRONOUS="FULL", DB_CACHE_SIZE=-64000,
+                     DB_MMAP_SIZE=256 * 1024 * 1024),
+    # Профиль приложения по умолчанию
+    "wal-normal": dict(DB_JOURNAL_MODE="WAL", DB_SYNCHRONOUS="NORMAL", DB_CACHE_SIZE=-64000,
+                       DB_MMAP_SIZE=256 * 1024 * 1024),
+}
+
+
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.errors = 0
+        self.locked = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.errors += 1
+        if "database is locked" in record.getMessage():
+            self.locked += 1
+
+
+def order_payload(number: int) -> tuple[dict, dict]:
+    user_info = {"id": 500000 + number % 200, "first_name": "Тест", "address": "Москва"}
+    order_data = {
+        "total": 2980.0,
+        "timestamp": "2025-09-01 12:00:00",
+        "items": [{"id_product": None, "name": "Кроссовки", "price": 1490.0, "quantity": 2}],
+    }
+    return user_info, order_data
+
+
+async def run_concurrently(total: int, workers: int, operation) -> float:
+    counter = iter(range(total))
+
+    async def worker():
+        for number in counter:
+            await operation(number)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return total / (time.perf_counter() - started)
+
+
+async def bench_profile(name: str, overrides: dict, args, locks: ErrorCounter) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"storechina-{name}-")
+    config = settings.model_copy(update=overrides | {
+        "DB_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+        "DB_POOL_SIZE": args.writers,
+    })
+    engine = database.create_db_engine(config)
+    # DAO работают через общий async_session_maker - на время замера привязываем его к движку профиля
+    database.async_session_maker.configure(bind=engine)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await UserDAO.add_many([{"telegram_id": 500000 + i, "full_name": f"Тест {i}"} for i in range(200)])
+
+        locks.errors = locks.locked = 0
+        if args.single_writer:
+            await writer.enable_write_queue(config).start()
+        try:
+            writes = await run_concurrently(args.orders, args.writers,
+                                            lambda number: OrderDAO.save_order_with_items(*order_payload(number)))
+        finally:
+            await writer.disable_write_queue()
+        write_errors, write_locks = locks.errors, locks.locked
+        reads = await run_concurrently(args.reads, args.readers, lambda number: OrderDAO.get_recent(limit=50))
+        return {"profile": name, "writes": writes, "reads": reads, "errors": write_errors, "locked": write_locks}
+    finally:
+        await engine.dispose()
+
+
+async def main_async(args) -> None:
+    locks = ErrorCounter()
+    logging.getLogger("app").addHandler(locks)
+    logging.getLogger("app").setLevel(logging.ERROR)
+    names = args.profiles or list(PROFILES)
+    print(f"{'profile':<12}{'orders/s':>10}{'reads/s':>10}{'errors':>8}{'locked':>8}")
+    for name in names:
+        result = await bench_profile(name, PROFILES[name], args, locks)
+        print(f"{name:<12}{result['writes']:>10,.0f}{result['reads']:>10,.0f}{result['errors']:>8}{result['locked']:>8}")
+    database.async_session_maker.configure(bind=database.engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000, help="сколько заказов записать")
+    parser.add_argument("--writers", type=int, default=20, help="параллельных писателей")
+    parser.add_argument("--reads", type=int, default=2000, help="сколько раз прочитать последние заказы")
+    parser.add_argument("--readers", type=int, default=20, help="параллельных читателей")
+    parser.add_argument("--single-writer", action="store_true", help="писать через очередь одного писателя")
+    parser.add_argument("--profiles", nargs="*", choices=list(PROFILES), help="какие профили сравнивать")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Массовая рассылка сообщения всем пользователям из таблицы ``users``.
+
+Получатели читаются порциями по ключу ``user_id`` (keyset-пагинация),
+внутри порции сообщения уходят параллельно в полосе BULK ограничителя
+запросов. После каждой порции результаты и курсор сохраняются в БД
+одной транзакцией, поэтому упавшую рассылку можно продолжить с места
+остановки: повторно могут уйти сообщения не более чем одной порции.
+
+Запуск: python -m app.bot.broadcast "Текст рассылки"
+        python -m app.bot.broadcast --resume 3
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from app.api.dao import UserDAO, BroadcastDAO
+from app.bot.throttling import Priority, send_priority
+from app.database import engine, read_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastRunner:
+    def __init__(self, bot: Bot, id_broadcast: int, message_text: str, after_user_id: int = 0,
+                 batch_size: int = 200, concurrency: int = 30):
+        self.bot = bot
+        self.id_broadcast = id_broadcast
+        self.message_text = message_text
+        self.after_user_id = after_user_id
+        self.batch_size = batch_size
+        self._limit = asyncio.Semaphore(concurrency)
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.started = 0.0
+
+    async def _send(self, user_id: int, telegram_id: int) -> dict:
+        async with self._limit:
+            try:
+                await self.bot.send_message(chat_id=telegram_id, text=self.message_text)
+                self.sent += 1
+                return {"user_id": user_id, "status": "sent"}
+            except TelegramForbiddenError as e:
+                # Пользователь заблокировал бота
+                self.blocked += 1
+                return {"user_id": user_id, "status": "blocked", "error": str(e)}
+            except Exception as e:
+                self.failed += 1
+                return {"user_id": user_id, "status": "failed", "error": str(e)}
+
+    async def run(self) -> dict:
+        self.started = time.monotonic()
+        with send_priority(Priority.BULK):
+            async for recipients in UserDAO.iter_batches(batch_size=self.batch_size, after=self.after_user_id,
+                                                         columns=["user_id", "telegram_id"]):
+                # Доставки и курсор пишутся одной транзакцией, поэтому после
+                # курсора доставок этой рассылки нет и проверять их не нужно
+                deliveries = await asyncio.gather(*(self._send(user_id, telegram_id)
+                                                    for user_id, telegram_id in recipients))
+                cursor = recipients[-1].user_id
+                await BroadcastDAO.record_batch(self.id_broadcast, list(deliveries), last_user_id=cursor)
+                logger.info("Рассылка %s: %s", self.id_broadcast, self.stats())
+        await BroadcastDAO.finish(self.id_broadcast)
+        stats = self.stats()
+        logger.info("Рассылка %s завершена: %s", self.id_broadcast, stats)
+        return stats
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "elapsed_s": round(elapsed, 1),
+            "per_second": round((self.sent + self.failed + self.blocked) / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+async def start_broadcast(bot: Bot, message_text: str, **kwargs) -> dict:
+    """Создаёт новую рассылку и отправляет её всем пользователям."""
+    id_broadcast = await BroadcastDAO.create(message_text)
+    logger.info("Рассылка %s создана", id_broadcast)
+    return await BroadcastRunner(bot, id_broadcast, message_text, **kwargs).run()
+
+
+async def resume_broadcast(bot: Bot, id_broadcast: int, **kwargs) -> dict | None:
+    """Продолжает незавершённую рассылку с сохранённого курсора."""
+    broadcast = await BroadcastDAO.find_one_or_none(id_broadcast=id_broadcast)
+    if broadcast is None or broadcast.status != 'running':
+        logger.error("Рассылка %s не найдена или уже завершена", id_broadcast)
+        return None
+    runner = BroadcastRunner(bot, id_broadcast, broadcast.message_text,
+                             after_user_id=broadcast.last_user_id, **kwargs)
+    runner.sent, runner.failed, runner.blocked = broadcast.sent, broadcast.failed, broadcast.blocked
+    return await runner.run()
+
+
+async def _main(args) -> None:
+    from app.bot.create_bot import bot
+
+    try:
+        if args.resume:
+            stats = await resume_broadcast(bot, args.resume, batch_size=args.batch_size,
+                                           concurrency=args.concurrency)
+        else:
+            stats = await start_broadcast(bot, args.text, batch_size=args.batch_size,
+                                          concurrency=args.concurrency)
+        print(stats)
+    finally:
+        await bot.session.close()
+        await engine.dispose()
+        if read_engine is not engine:
+            await read_engine.dispose()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("text", nargs="?", help="текст рассылки (HTML)")
+    parser.add_argument("--resume", type=int, help="id незавершённой рассылки")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=30)
+    args = parser.parse_args()
+    if not args.text and not args.resume:
+        parser.error("нужен текст рассылки или --resume")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,39 @@
+import asyncio
+
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 
+from app.bot.middlewares import DbSessionMiddleware, HandlerLatencyMiddleware, SendPriorityMiddleware
+from app.bot.throttling import RateLimitMiddleware
 from app.config import settings
 
 
-bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+session = AiohttpSession(api=TelegramAPIServer.from_base(settings.BOT_API_URL)) if settings.BOT_API_URL else None
+bot = Bot(token=settings.BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
+dp.update.outer_middleware(HandlerLatencyMiddleware())
+dp.update.outer_middleware(DbSessionMiddleware())
+dp.update.outer_middleware(SendPriorityMiddleware())
+rate_limiter = RateLimitMiddleware(global_rate=settings.BOT_GLOBAL_RATE,
+                                   chat_rate=settings.BOT_CHAT_RATE,
+                                   chat_burst=settings.BOT_CHAT_BURST,
+                                   max_retries=settings.BOT_MAX_RETRIES)
+bot.session.middleware(rate_limiter)
+
+
+async def notify_admins(text: str) -> int:
+    """Отправляет сообщение всем администраторам одновременно, возвращает число доставленных."""
+    results = await asyncio.gather(*(bot.send_message(chat_id=admin, text=text) for admin in settings.ADMIN_ID),
+                                   return_exceptions=True)
+    return sum(not isinstance(result, Exception) for result in results)
 
 
 async def start_bot():
-    count = 0
-    for admin in settings.ADMIN_ID:
-        try:
-            await bot.send_message(chat_id=admin, text=f"Я запущен🥳")
-            count += 1
-        except:
-            pass
+    await notify_admins("Я запущен🥳")
 
 
 async def stop_bot():
-    count = 0
-    for admin in settings.ADMIN_ID:
-        try:
-            await bot.send_message(chat_id=admin, text=f"Я остановлен😔. За что?")
-            count += 1
-        except:
-            pass
\ No newline at end of file
+    await notify_admins("Я остановлен😔. За что?")
\ No newline at end of file
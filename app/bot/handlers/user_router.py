@@ -1,9 +1,13 @@
+import json
+
 from aiogram import Router, F
 from aiogram.filters import CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.analytics import analytics
 from app.api.dao import UserDAO
 import app.bot.keyboards.kbs as kb
 from app.bot.utils import greet_user
@@ -17,17 +21,14 @@ class Registration(StatesGroup):
 
 
 @user_router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, session: AsyncSession):
     """
     Обрабатывает команду /start.
     """
-    user = await UserDAO.find_one_or_none(telegram_id=message.from_user.id)
+    analytics.track("button", name="start", telegram_id=message.from_user.id)
+    user = await UserDAO.get_cached(message.from_user.id)
 
     if not user:
-        await message.answer(
-            f'Привет Дорогой Покупатель! 👋\n'
-            f'Я твой телеграмм AI-помошник для TaoBao 😊\n'
-        )
         # Предварительная регистрация пользователя без номера телефона
         await UserDAO.register_or_update(
             telegram_id=message.from_user.id,
@@ -35,6 +36,12 @@ async def cmd_start(message: Message, state: FSMContext):
             last_name=message.from_user.last_name,
             username=message.from_user.username
         )
+        # Фиксируем запись до отправки сообщений, чтобы не держать блокировку БД
+        await session.commit()
+        await message.answer(
+            f'Привет Дорогой Покупатель! 👋\n'
+            f'Я твой телеграмм AI-помошник для TaoBao 😊\n'
+        )
         await message.answer(
             '☎️ Для продолжения, пожалуйста, поделитесь вашим номером телефона.',
             # Предполагается, что kb.clients_phone() создает клавиатуру с кнопкой request_contact
@@ -47,7 +54,7 @@ async def cmd_start(message: Message, state: FSMContext):
 
 
 @user_router.message(Registration.waiting_for_phone, F.contact)
-async def process_contact(message: Message, state: FSMContext):
+async def process_contact(message: Message, state: FSMContext, session: AsyncSession):
     """
     Обрабатывает получение номера телефона и завершает регистрацию.
     """
@@ -61,7 +68,9 @@ async def process_contact(message: Message, state: FSMContext):
         telegram_id=message.from_user.id,
         phone=message.contact.phone_number
     )
+    await session.commit()
     await state.clear()
+    analytics.track("registration", telegram_id=message.from_user.id)
     await message.answer("Спасибо! Ваш номер телефона сохранен.")
     # Теперь, когда регистрация завершена, приветствуем пользователя
     await greet_user(message, is_new_user=True)
@@ -80,8 +89,23 @@ async def cmd_back_home(message: Message) -> None:
     """
     Обрабатывает нажатие кнопки "Назад".
     """
+    analytics.track("button", name="back", telegram_id=message.from_user.id)
     await greet_user(message, is_new_user=False)
 
+@user_router.message(F.web_app_data)
+async def process_search(message: Message) -> None:
+    """
+    Обрабатывает данные, отправленные веб-приложением "Поиск товара".
+    """
+    try:
+        data = json.loads(message.web_app_data.data)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+    analytics.track("search", telegram_id=message.from_user.id, query=data.get("query") or data.get("text"))
+
+
 '''@user_router.message(F.text == "ℹ️ О нас")
 async def about_us(message: Message):
     kb = kb.app_keyboard(user_id=message.from_user.id, first_name=message.from_user.first_name)
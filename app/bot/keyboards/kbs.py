@@ -7,7 +7,8 @@ from app.config import settings
 
 def main_keyboard(user_id: int, first_name: str) -> ReplyKeyboardMarkup:
     kb = ReplyKeyboardBuilder()
-    url_applications = f"{settings.BASE_SITE}/applications?user_id={user_id}"
+    # Клиента страница берёт из initData веб-приложения
+    url_applications = f"{settings.BASE_SITE}/applications"
     url_add_application = f'{settings.BASE_SITE}/form?user_id={user_id}&first_name={first_name}'
     kb.button(text="🛍 Мои покупки", web_app=WebAppInfo(url=url_applications))
     kb.button(text="🔍 Поиск товара", web_app=WebAppInfo(url=url_add_application))
@@ -0,0 +1,75 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.api.analytics import analytics
+from app.bot.throttling import Priority, send_priority
+from app.database import unit_of_work
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает одну сессию и транзакцию БД на весь апдейт.
+
+    Вызовы DAO в обработчике используют эту сессию, изменения коммитятся
+    одним разом после обработчика или откатываются целиком при ошибке.
+    Сессия также доступна обработчику как аргумент ``session``.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with unit_of_work() as session:
+            data["session"] = session
+            return await handler(event, data)
+
+
+class SendPriorityMiddleware(BaseMiddleware):
+    """
+    Отправляет ответы обработчиков апдейтов в полосе ``priority``.
+
+    Ответы пользователю (в том числе подтверждения заказов) обгоняют
+    рассылки и служебные уведомления в общем ведре Bot API.
+    """
+
+    def __init__(self, priority: Priority = Priority.HIGH):
+        self.priority = priority
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        with send_priority(self.priority):
+            return await handler(event, data)
+
+
+class HandlerLatencyMiddleware(BaseMiddleware):
+    """
+    Записывает время обработки апдейта событием ``handler_latency``.
+
+    Регистрируется раньше ``DbSessionMiddleware``, так что в замер входит
+    и коммит транзакции апдейта. Событие только ставится в буфер аналитики.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = await handler(event, data)
+            ok = True
+            return result
+        finally:
+            analytics.track("handler_latency", update=getattr(event, "event_type", type(event).__name__),
+                            ms=round((time.perf_counter() - started) * 1000, 2), ok=ok)
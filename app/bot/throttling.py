@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Полосы приоритета исходящих сообщений: меньше - важнее."""
+    HIGH = 0     # подтверждения заказов, ответы на действия пользователя
+    NORMAL = 1
+    BULK = 2     # рассылки
+
+
+_current_priority: ContextVar[Priority] = ContextVar("send_priority", default=Priority.NORMAL)
+
+
+@contextmanager
+def send_priority(priority: Priority):
+    """Задаёт полосу приоритета для всех отправок внутри блока ``with``."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    """Классическое ведро токенов: ``rate`` токенов в секунду, не больше ``burst`` про запас."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Забирает токен (возможно, в долг) и возвращает, сколько секунд надо подождать."""
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Следующий токен будет выдан не раньше чем через ``seconds`` секунд."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class PriorityTokenBucket(TokenBucket):
+    """
+    Общее ведро токенов с очередью ожидания по приоритетам.
+
+    Когда токенов нет, запросы ждут в куче по (приоритет, порядок
+    поступления), так что сообщения полосы HIGH обгоняют рассылки.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        super().__init__(rate, burst)
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._pump_task: asyncio.Task | None = None
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов, например на время retry_after от Telegram."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0)
+
+    async def acquire(self, priority: Priority) -> None:
+        if not self._waiters and time.monotonic() >= self._paused_until:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._counter), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self) -> None:
+        while self._waiters:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+
+
+class _LaneStats:
+    def __init__(self):
+        self.requests = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float) -> None:
+        self.requests += 1
+        if wait > 0.001:
+            self.waited += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "waited": self.waited,
+            "avg_wait_ms": round(self.wait_total / self.waited * 1000, 3) if self.waited else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Планировщик исходящих запросов к Bot API.
+
+    Каждый метод с ``chat_id`` проходит через ведро токенов своего чата и
+    общее ведро бота с полосами приоритета (см. ``send_priority``). На
+    ответ 429 на ``retry_after`` секунд ставится на паузу ведро этого чата,
+    а если за ``flood_window`` секунд 429 пришёл в ``flood_chats`` разных
+    чатах - общее ведро: это уже ограничение всего бота. Запрос
+    повторяется не более ``max_retries`` раз.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 max_retries: int = 3, max_chats: int = 10000, flood_chats: int = 3, flood_window: float = 1.0):
+        self.global_bucket = PriorityTokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chat_buckets: OrderedDict[int | str, TokenBucket] = OrderedDict()
+        self._lanes = {priority: _LaneStats() for priority in Priority}
+        self.flood_chats = flood_chats
+        self.flood_window = flood_window
+        # Чаты с недавним 429 -> время ответа, старые в начале
+        self._recent_retry_after: OrderedDict[int | str, float] = OrderedDict()
+        self.retry_after_hits = 0
+        self.global_pauses = 0
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _is_global_flood(self, chat_id: int | str) -> bool:
+        """Отмечает 429 в чате; True, если за окно 429 пришёл в ``flood_chats`` разных чатах."""
+        now = time.monotonic()
+        self._recent_retry_after[chat_id] = now
+        self._recent_retry_after.move_to_end(chat_id)
+        while next(iter(self._recent_retry_after.values())) < now - self.flood_window:
+            self._recent_retry_after.popitem(last=False)
+        return len(self._recent_retry_after) >= self.flood_chats
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = _current_priority.get()
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            await self.global_bucket.acquire(priority)
+            self._lanes[priority].record(time.monotonic() - started)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after_hits += 1
+                if attempt == self.max_retries:
+                    raise
+                if self._is_global_flood(chat_id):
+                    self.global_pauses += 1
+                    logger.warning("Flood control Telegram: пауза всех отправок на %s с перед повтором %s",
+                                   e.retry_after, type(method).__name__)
+                    self.global_bucket.pause(e.retry_after)
+                else:
+                    logger.warning("Flood control Telegram: пауза чата %s на %s с перед повтором %s", chat_id,
+                                   e.retry_after, type(method).__name__)
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "lanes": {priority.name.lower(): lane.as_dict() for priority, lane in self._lanes.items()},
+            "queued": len(self.global_bucket._waiters),
+            "tracked_chats": len(self._chat_buckets),
+            "retry_after": self.retry_after_hits,
+            "global_pauses": self.global_pauses,
+        }
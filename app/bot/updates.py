@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.api.dao import BotStateDAO
+
+
+logger = logging.getLogger(__name__)
+
+HIGH_WATER_MARK_KEY = "last_update_id"
+
+
+def update_key(update: Update) -> int:
+    """
+    Возвращает ключ упорядочивания апдейта: id чата, иначе id пользователя.
+
+    Апдейты с одинаковым ключом обрабатываются строго по очереди.
+    """
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+    chat = getattr(event, "chat", None)
+    if chat is None:
+        # callback_query несёт чат во вложенном сообщении
+        message = getattr(event, "message", None)
+        chat = getattr(message, "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None) or getattr(event, "user", None)
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+class _Shard:
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue[Update] = asyncio.Queue(maxsize=maxsize)
+        self.max_depth = 0
+        self.processed = 0
+        self.rejected = 0
+
+
+class UpdateQueue:
+    """
+    Шардированная очередь входящих апдейтов.
+
+    Вебхук кладёт апдейт в очередь и сразу отвечает Telegram. Апдейт
+    попадает в шард по ``update_key``, у каждого шарда своя ограниченная
+    очередь и один воркер, вызывающий ``dp.feed_update``. Так апдейты
+    одного чата идут строго по порядку, а разные чаты обрабатываются
+    параллельно. Когда шард заполнен, ``submit`` ждёт не дольше
+    ``enqueue_timeout`` и возвращает False - вебхук отвечает 503, и
+    Telegram повторит доставку позже. Активный пользователь забивает
+    только свой шард и не задерживает остальных.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, shards: int = 8, shard_size: int = 100,
+                 enqueue_timeout: float = 0.5):
+        self.bot = bot
+        self.dp = dp
+        self.enqueue_timeout = enqueue_timeout
+        self._shards = [_Shard(shard_size) for _ in range(shards)]
+        self._tasks: list[asyncio.Task] = []
+        self._accepting = False
+        # Метрики
+        self.enqueued = 0
+        self.failed = 0
+        self.rejected = 0
+        self.enqueue_wait_total = 0.0
+
+    def shard_for(self, update: Update) -> int:
+        return update_key(update) % len(self._shards)
+
+    async def start(self) -> None:
+        self._accepting = True
+        self._tasks = [asyncio.create_task(self._worker(i), name=f"update-shard-{i}")
+                       for i in range(len(self._shards))]
+        logger.info("Очередь апдейтов запущена: шардов %s, ёмкость шарда %s",
+                    len(self._shards), self._shards[0].queue.maxsize)
+
+    async def submit(self, update: Update) -> bool:
+        """Ставит апдейт в очередь его шарда. Возвращает False, если шард переполнен."""
+        if not self._accepting:
+            self.rejected += 1
+            return False
+        shard = self._shards[self.shard_for(update)]
+        started = time.perf_counter()
+        try:
+            shard.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(shard.queue.put(update), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                shard.rejected += 1
+                logger.warning("Шард очереди переполнен, апдейт %s отклонён", update.update_id)
+                return False
+        self.enqueue_wait_total += time.perf_counter() - started
+        self.enqueued += 1
+        shard.max_depth = max(shard.max_depth, shard.queue.qsize())
+        return True
+
+    async def _worker(self, number: int) -> None:
+        shard = self._shards[number]
+        while True:
+            update = await shard.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                shard.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Ошибка обработки апдейта %s в шарде %s: %s", update.update_id, number, e)
+            finally:
+                shard.queue.task_done()
+
+    async def drain(self, timeout: float = 25.0) -> None:
+        """Перестаёт принимать апдейты, дожидается обработки очередей и останавливает воркеров."""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(shard.queue.join() for shard in self._shards)), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Не дождались обработки %s апдейтов при остановке", self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Очередь апдейтов остановлена, обработано %s", self.processed)
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.queue.qsize() for shard in self._shards)
+
+    @property
+    def processed(self) -> int:
+        return sum(shard.processed for shard in self._shards)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "shards": len(self._shards),
+            "shard_capacity": self._shards[0].queue.maxsize,
+            "shard_depth": [shard.queue.qsize() for shard in self._shards],
+            "shard_max_depth": [shard.max_depth for shard in self._shards],
+            "shard_rejected": [shard.rejected for shard in self._shards],
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_enqueue_wait_ms": round(self.enqueue_wait_total / self.enqueued * 1000, 3) if self.enqueued else 0.0,
+        }
+
+
+class UpdateDeduplicator:
+    """
+    Отсекает повторные доставки одного и того же ``update_id``.
+
+    Недавние id хранятся в кольцевом буфере фиксированного размера и
+    словаре для проверки за O(1). При ``persist=True`` максимальный
+    принятый id периодически сохраняется в таблицу ``bot_state``, и после
+    перезапуска отбрасываются апдейты из окна ``(отметка - size, отметка]``.
+    Id ниже окна принимаются: Telegram может начать нумерацию заново.
+    Отметка не сохраняется дальше id, забытых через ``forget``, пока их
+    повторная доставка не принята.
+    """
+
+    def __init__(self, size: int = 10000, persist: bool = False, flush_interval: float = 5.0):
+        self._ring: deque[int] = deque(maxlen=size)
+        # id -> порядковый номер его записи в кольце; забытые id остаются
+        # в кольце, но не в словаре
+        self._seen: dict[int, int] = {}
+        self._appended = 0
+        self.persist = persist
+        self.flush_interval = flush_interval
+        self.high_water_mark = 0
+        self._saved_mark = 0
+        self._restored_mark = 0
+        # Забытые id, повторная доставка которых ещё не пришла
+        self._forgotten: set[int] = set()
+        self._task: asyncio.Task | None = None
+        # Метрики
+        self.duplicates = 0
+
+    async def start(self) -> None:
+        if not self.persist:
+            return
+        value = await BotStateDAO.get_value(HIGH_WATER_MARK_KEY)
+        # Апдейты не новее отметки, сохранённой до перезапуска, уже принимались
+        self._restored_mark = int(value) if value else 0
+        self.high_water_mark = self._saved_mark = self._restored_mark
+        self._task = asyncio.create_task(self._flush_loop(), name="update-dedup-flush")
+        logger.info("Последний обработанный апдейт: %s", self.high_water_mark)
+
+    def is_duplicate(self, update_id: int) -> bool:
+        """Запоминает id и возвращает True, если такой апдейт уже принимали."""
+        size = self._ring.maxlen
+        if update_id in self._seen or self._restored_mark - size < update_id <= self._restored_mark:
+            self.duplicates += 1
+            return True
+        if len(self._ring) == size:
+            oldest = self._ring[0]
+            # Забытый и снова принятый id лежит в кольце дважды - старая запись
+            # не должна вытеснять новую
+            if self._seen.get(oldest) == self._appended - size:
+                del self._seen[oldest]
+        self._ring.append(update_id)
+        self._seen[update_id] = self._appended
+        self._appended += 1
+        self._forgotten.discard(update_id)
+        if update_id > self.high_water_mark:
+            self.high_water_mark = update_id
+        elif update_id <= self.high_water_mark - size:
+            # Id намного меньше отметки - Telegram начал нумерацию заново
+            self.high_water_mark = update_id
+            self._restored_mark = 0
+        return False
+
+    def forget(self, update_id: int) -> None:
+        """Убирает id из недавних, чтобы повторная доставка была принята (например, после 503)."""
+        if self._seen.pop(update_id, None) is not None:
+            self._forgotten.add(update_id)
+
+    async def flush(self) -> None:
+        if not self.persist:
+            return
+        mark = self.high_water_mark
+        # Забытые id ниже окна после перезапуска и так будут приняты
+        self._forgotten = {update_id for update_id in self._forgotten if update_id > mark - self._ring.maxlen}
+        if self._forgotten:
+            mark = min(mark, min(self._forgotten) - 1)
+        if mark == self._saved_mark:
+            return
+        await BotStateDAO.set_value(HIGH_WATER_MARK_KEY, str(mark))
+        self._saved_mark = mark
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Не удалось сохранить отметку апдейтов: %s", e)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._ring),
+            "capacity": self._ring.maxlen,
+            "duplicates": self.duplicates,
+            "high_water_mark": self.high_water_mark,
+        }
@@ -1,4 +1,6 @@
 import os 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,6 +8,98 @@ class Settings(BaseSettings):
     BOT_TOKEN: str
     BASE_SITE: str 
     ADMIN_ID:  list[int]
+
+    # Обработка вебхука: inline - апдейт обрабатывается внутри запроса,
+    # queue - апдейт кладётся в очередь и Telegram сразу получает 200
+    WEBHOOK_MODE: Literal["inline", "queue"] = "inline"
+    # Апдейты одного чата идут по порядку в своём шарде, шарды работают параллельно
+    UPDATE_SHARDS: int = 8
+    UPDATE_SHARD_QUEUE_SIZE: int = 100
+    UPDATE_ENQUEUE_TIMEOUT: float = 0.5
+    UPDATE_DRAIN_TIMEOUT: float = 25.0
+    # Отсев повторных доставок: сколько последних update_id помнить и
+    # сохранять ли отметку последнего апдейта в БД между перезапусками
+    UPDATE_DEDUP_SIZE: int = 10000
+    UPDATE_DEDUP_PERSIST: bool = False
+
+    # Адрес Bot API, например локальной заглушки для нагрузочных тестов
+    BOT_API_URL: str | None = None
+
+    # Доступ к HTTP API: секретный токен админских выгрузок для скриптов
+    # (не задан - только через веб-приложение администратора) и срок
+    # действия подписи initData веб-приложения в секундах (0 - бессрочно)
+    ADMIN_API_TOKEN: str | None = None
+    WEBAPP_AUTH_MAX_AGE: float = 86400.0
+
+    # Ограничение исходящих запросов к Bot API (сообщений в секунду)
+    BOT_GLOBAL_RATE: float = 30.0
+    BOT_CHAT_RATE: float = 1.0
+    BOT_CHAT_BURST: float = 3.0
+    BOT_MAX_RETRIES: int = 3
+
+    # Профиль хранилища SQLite, применяется один раз при создании движка
+    DB_URL: str = "sqlite+aiosqlite:///db.sqlite3"
+    DB_JOURNAL_MODE: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    DB_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    # Действует только для новой БД; существующую переводят вручную: PRAGMA auto_vacuum=...; VACUUM;
+    DB_AUTO_VACUUM: Literal["NONE", "FULL", "INCREMENTAL"] = "INCREMENTAL"
+    DB_CACHE_SIZE: int = -64000  # отрицательное значение - в КиБ
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024
+    DB_BUSY_TIMEOUT: int = 5000  # мс
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # Отдельный пул соединений только для чтения
+    DB_READ_ENGINE: bool = True
+    DB_READ_POOL_SIZE: int = 10
+    DB_READ_MAX_OVERFLOW: int = 10
+    # Все изменения идут через одно соединение-писатель с групповым коммитом
+    DB_SINGLE_WRITER: bool = False
+    DB_WRITER_BATCH: int = 64
+    DB_WRITER_MAX_DELAY: float = 0.002
+
+    # Курс юаня: значение по умолчанию для пустой БД, файл с актуальным
+    # курсом для периодического обновления и интервал проверки в секундах,
+    # а также сколько секунд курс в памяти процесса верен без перечитывания из БД
+    EXCHANGE_RATE_DEFAULT: float = 12.5
+    EXCHANGE_RATE_FILE: str | None = None
+    EXCHANGE_RATE_REFRESH: float = 3600.0
+    EXCHANGE_RATE_TTL: float = 60.0
+
+    # Пересчёт цен товаров: рубли = юани * курс * (1 + наценка %) + фикс. наценка,
+    # округлённые до шага (к ближайшему или вверх). Пересчёт идёт пачками по
+    # REPRICE_CHUNK_SIZE товаров; при REPRICE_ON_RATE_CHANGE - после смены курса
+    REPRICE_MARKUP_PERCENT: float = 0.0
+    REPRICE_MARKUP_FIXED: float = 0.0
+    REPRICE_ROUND_STEP: float = 1.0
+    REPRICE_ROUND_MODE: Literal["nearest", "up"] = "nearest"
+    REPRICE_CHUNK_SIZE: int = 2000
+    REPRICE_ON_RATE_CHANGE: bool = False
+
+    # Как часто сверять счётчики строк с COUNT(*), в секундах (0 - не сверять)
+    STATS_RECONCILE_INTERVAL: float = 3600.0
+
+    # Кэш клиентов по telegram_id: размер и срок жизни записи в секундах
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 300.0
+
+    # Кэш истории заказов по клиентам: сколько клиентов держать и срок жизни в секундах
+    ORDER_HISTORY_CACHE_SIZE: int = 5000
+    ORDER_HISTORY_CACHE_TTL: float = 60.0
+
+    # События аналитики: предел буфера в памяти (сверх него события отбрасываются),
+    # размер пачки записи и максимальная задержка записи в секундах
+    ANALYTICS_BUFFER_SIZE: int = 10000
+    ANALYTICS_BATCH_SIZE: int = 500
+    ANALYTICS_FLUSH_INTERVAL: float = 5.0
+
+    # Очистка сессий поиска: как часто запускать (0 - не очищать), сколько хранить
+    # просроченные сессии до удаления (с), размер пачки и сколько свободных страниц
+    # возвращать ОС после удаления (0 - не делать incremental_vacuum, нужен
+    # DB_AUTO_VACUUM=INCREMENTAL)
+    SESSION_SWEEP_INTERVAL: float = 300.0
+    SESSION_RETENTION: float = 86400.0
+    SESSION_SWEEP_CHUNK: int = 500
+    SESSION_VACUUM_PAGES: int = 0
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
     )
@@ -1,33 +1,51 @@
 import logging
+import os
+import sqlite3
+from functools import lru_cache
 
-from sqlalchemy import event
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, tuple_
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
-from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
 from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete, func
 
-from app.database import Base, engine, async_session_maker
-from app.api.models import User, Order, OrderItem, ExchangeRate
+from app.database import Base, engine, unit_of_work, read_session
+from app.dao.writer import writer_operation
+from app.api.models import ExchangeRate
+from app.config import settings
 
 
 logger = logging.getLogger(__name__)
 
+# Лимит параметров в одном запросе SQLite (SQLITE_MAX_VARIABLE_NUMBER)
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
 
 class BaseDAO:
+    """
+    Базовые операции с моделью.
+
+    Изменяющие методы работают внутри ``unit_of_work``: если вызов идёт из
+    обработчика апдейта, используется общая сессия и транзакция апдейта,
+    иначе открывается своя и коммитится по завершении метода. Читающие
+    методы используют ``read_session`` и пул соединений только для чтения.
+    """
     model = None  # Устанавливается в дочернем классе
 
     @classmethod
     async def find_one_or_none_by_id(cls, data_id: int):
-        # Найти запись по ID
-        async with async_session_maker() as session:
-            query = select(cls.model).filter_by(id=data_id)
+        # Найти запись по первичному ключу
+        async with read_session() as session:
+            query = select(cls.model).where(cls.model.__mapper__.primary_key[0] == data_id)
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
     @classmethod
     async def find_one_or_none(cls, **filter_by):
         # Найти одну запись по фильтрам
-        async with async_session_maker() as session:
+        async with read_session() as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalar_one_or_none()
@@ -35,121 +53,242 @@ class BaseDAO:
     @classmethod
     async def find_all(cls, **filter_by):
         # Найти все записи по фильтрам
-        async with async_session_maker() as session:
+        async with read_session() as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalars().all()
 
     @classmethod
+    @writer_operation
     async def add(cls, **values):
         # Добавить одну запись
-        async with async_session_maker() as session:
-            async with session.begin():
-                new_instance = cls.model(**values)
-                session.add(new_instance)
-                try:
-                    await session.commit()
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    raise e
-                return new_instance
+        async with unit_of_work() as session:
+            new_instance = cls.model(**values)
+            session.add(new_instance)
+            await session.flush()
+            return new_instance
 
     @classmethod
+    @writer_operation
     async def add_many(cls, instances: list[dict]):
         # Добавить несколько записей
-        async with async_session_maker() as session:
-            async with session.begin():
-                new_instances = [cls.model(**values) for values in instances]
-                session.add_all(new_instances)
-                try:
-                    await session.commit()
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    raise e
-                return new_instances
+        async with unit_of_work() as session:
+            new_instances = [cls.model(**values) for values in instances]
+            session.add_all(new_instances)
+            await session.flush()
+            return new_instances
+
+    @classmethod
+    def _with_server_onupdate(cls, set_: dict) -> dict:
+        """Дополняет SET для ON CONFLICT колонками с server_onupdate: в SQLite они сами не срабатывают."""
+        if set_:
+            for column in cls.model.__table__.c:
+                if column.server_onupdate is not None and column.name not in set_:
+                    set_[column.name] = column.server_onupdate.arg
+        return set_
+
+    @classmethod
+    @writer_operation
+    async def bulk_upsert(cls, rows: list[dict], index_elements: list[str],
+                          update_columns: list[str] | None = None, chunk_size: int = 2000) -> dict:
+        """
+        Вставляет или обновляет записи пачками ``INSERT ... ON CONFLICT DO UPDATE``.
+
+        ``index_elements`` - уникальный ключ конфликта (например, ``["taobao_item_id"]``),
+        ``update_columns`` - что обновлять у существующих записей (по умолчанию
+        все переданные поля, кроме ключа). Все строки должны содержать одинаковый
+        набор полей; при повторе ключа во входных данных побеждает последняя строка.
+        ORM-объекты не создаются: пачка уходит одним executemany, а число
+        существующих ключей пачки считается запросом ``IN``, поэтому размер
+        пачки ограничен лимитом параметров SQLite.
+        Возвращает ``{"inserted": ..., "updated": ...}``.
+        """
+        if not rows:
+            return {"inserted": 0, "updated": 0}
+        columns = list(rows[0])
+        if any(row.keys() != rows[0].keys() for row in rows):
+            raise ValueError("Все строки bulk_upsert должны содержать одинаковый набор полей.")
+        if update_columns is None:
+            update_columns = [column for column in columns if column not in index_elements]
+        unique_rows = list({tuple(row[key] for key in index_elements): row for row in rows}.values())
+        chunk_size = min(chunk_size, SQLITE_MAX_VARIABLES // len(index_elements))
+
+        table = cls.model.__table__
+        key_columns = [table.c[key] for key in index_elements]
+        key_expr = key_columns[0] if len(key_columns) == 1 else tuple_(*key_columns)
+        stmt = sqlite_insert(table)
+        set_ = cls._with_server_onupdate({column: stmt.excluded[column] for column in update_columns})
+        if set_:
+            stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=key_columns)
+
+        inserted = updated = 0
+        async with unit_of_work() as session:
+            for start in range(0, len(unique_rows), chunk_size):
+                chunk = unique_rows[start:start + chunk_size]
+                keys = [tuple(row[key] for key in index_elements) for row in chunk]
+                existing = (await session.execute(
+                    select(func.count()).select_from(table)
+                    .where(key_expr.in_([key[0] for key in keys] if len(key_columns) == 1 else keys))
+                )).scalar()
+                await session.execute(stmt, chunk)
+                inserted += len(chunk) - existing
+                if set_:
+                    updated += existing
+        return {"inserted": inserted, "updated": updated}
 
     @classmethod
+    @writer_operation
     async def update(cls, filter_by, **values):
         # Обновить записи по фильтру
-        async with async_session_maker() as session:
-            async with session.begin():
-                query = (
-                    sqlalchemy_update(cls.model)
-                    .where(*[getattr(cls.model, k) == v for k, v in filter_by.items()])
-                    .values(**values)
-                    .execution_options(synchronize_session="fetch")
-                )
-                result = await session.execute(query)
-                try:
-                    await session.commit()
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    raise e
-                return result.rowcount
+        async with unit_of_work() as session:
+            query = (
+                sqlalchemy_update(cls.model)
+                .where(*[getattr(cls.model, k) == v for k, v in filter_by.items()])
+                .values(**values)
+                .execution_options(synchronize_session="fetch")
+            )
+            result = await session.execute(query)
+            return result.rowcount
 
     @classmethod
+    @writer_operation
     async def delete(cls, delete_all: bool = False, **filter_by):
         # Удалить записи по фильтру
         if not delete_all and not filter_by:
             raise ValueError("Нужен хотя бы один фильтр для удаления.")
 
-        async with async_session_maker() as session:
-            async with session.begin():
-                query = sqlalchemy_delete(cls.model).filter_by(**filter_by)
-                result = await session.execute(query)
-                try:
-                    await session.commit()
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    raise e
-                return result.rowcount
+        async with unit_of_work() as session:
+            query = sqlalchemy_delete(cls.model).filter_by(**filter_by)
+            result = await session.execute(query)
+            return result.rowcount
 
     @classmethod
     async def count(cls, **filter_by):
         # Подсчитать количество записей
-        async with async_session_maker() as session:
-            query = select(func.count(cls.model.id)).filter_by(**filter_by)
+        async with read_session() as session:
+            query = select(func.count()).select_from(cls.model).filter_by(**filter_by)
             result = await session.execute(query)
             return result.scalar()
 
     @classmethod
     async def exists(cls, **filter_by):
         # Проверить существование записи
-        async with async_session_maker() as session:
-            query = select(cls.model).filter_by(**filter_by).exists()
+        async with read_session() as session:
+            query = select(select(cls.model).filter_by(**filter_by).exists())
             result = await session.execute(query)
             return result.scalar()
 
     @classmethod
     async def paginate(cls, page: int = 1, page_size: int = 10, **filter_by):
-        # Пагинация записей
-        async with async_session_maker() as session:
+        # Пагинация записей (OFFSET: для дальних страниц используйте paginate_keyset)
+        async with read_session() as session:
             query = select(cls.model).filter_by(**filter_by)
             result = await session.execute(query.offset((page - 1) * page_size).limit(page_size))
             return result.scalars().all()
-        
+
+    @classmethod
+    def _keyset_columns(cls, order_by: str | None) -> list:
+        """Колонки сортировки для keyset-пагинации: ``order_by`` (если задан) и первичный ключ."""
+        mapper = cls.model.__mapper__
+        if len(mapper.primary_key) != 1:
+            raise ValueError("Keyset-пагинация поддерживает только модели с простым первичным ключом.")
+        pk = getattr(cls.model, mapper.get_property_by_column(mapper.primary_key[0]).key)
+        if order_by is None or order_by == pk.key:
+            return [pk]
+        column = cls.model.__table__.c[order_by]
+        if not (column.index or column.unique or any(index.columns[0] is column for index in cls.model.__table__.indexes)):
+            raise ValueError(f"Колонка {order_by} не проиндексирована, keyset-пагинация по ней будет сканировать таблицу.")
+        return [getattr(cls.model, order_by), pk]
+
+    @classmethod
+    async def paginate_keyset(cls, after=None, limit: int = 100, order_by: str | None = None,
+                              columns: list[str] | None = None, **filter_by) -> tuple[list, object]:
+        """
+        Страница записей после курсора ``after`` (keyset-пагинация).
+
+        Сортировка идёт по индексированной колонке ``order_by`` и первичному
+        ключу, поэтому любая страница читается по индексу за одно и то же
+        время, в отличие от OFFSET. ``columns`` - вернуть только эти поля
+        (строки вместо ORM-объектов; колонки сортировки должны входить в них).
+        Возвращает ``(rows, next_cursor)``; ``next_cursor`` равен None на
+        последней странице. Курсор - значение первичного ключа или кортеж
+        ``(order_by, pk)``.
+        """
+        keys = cls._keyset_columns(order_by)
+        if columns and any(key.key not in columns for key in keys):
+            raise ValueError("columns должны включать колонки сортировки.")
+        entities = [getattr(cls.model, column) for column in columns] if columns else [cls.model]
+        query = select(*entities).filter_by(**filter_by).order_by(*keys).limit(limit)
+        if after is not None:
+            query = query.where(keys[0] > after if len(keys) == 1 else tuple_(*keys) > tuple(after))
+        async with read_session() as session:
+            result = await session.execute(query)
+            rows = result.all() if columns else result.scalars().all()
+        if len(rows) < limit:
+            return rows, None
+        last = rows[-1]
+        cursor = tuple(getattr(last, key.key) for key in keys)
+        return rows, cursor[0] if len(keys) == 1 else cursor
+
+    @classmethod
+    async def iter_batches(cls, batch_size: int = 1000, order_by: str | None = None,
+                           columns: list[str] | None = None, after=None, **filter_by):
+        """
+        Асинхронно перебирает таблицу порциями по ``batch_size`` строк.
+
+        Каждая порция читается отдельным коротким запросом через
+        ``paginate_keyset``, так что в памяти держится не больше одной порции,
+        а длинная читающая транзакция не мешает checkpoint WAL.
+        """
+        cursor = after
+        while True:
+            rows, cursor = await cls.paginate_keyset(after=cursor, limit=batch_size, order_by=order_by,
+                                                     columns=columns, **filter_by)
+            if rows:
+                yield rows
+            if cursor is None:
+                return
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migration")
+
+
+@lru_cache(maxsize=1)
+def _script_directory() -> ScriptDirectory:
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    return ScriptDirectory.from_config(config)
+
+
+def _prepare_schema(connection) -> str:
+    """
+    Создаёт таблицы, только если схема не на последней ревизии Alembic.
+
+    Пустую БД после create_all помечает последней ревизией, чтобы
+    следующие запуски не проверяли каждую таблицу заново.
+    """
+    script = _script_directory()
+    context = MigrationContext.configure(connection)
+    if set(context.get_current_heads()) == set(script.get_heads()):
+        return "актуальна"
+    fresh = not inspect(connection).get_table_names()
+    Base.metadata.create_all(connection)
+    if fresh:
+        context.stamp(script, "heads")
+        return "создана"
+    return "дополнена через create_all"
+
 
 async def init_db():
     """Создаёт базу данных и все таблицы, если их нет, используя SQLAlchemy."""
-    @event.listens_for(engine.sync_engine, "connect")
-    def set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
-
     try:
         async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-
-        async with async_session_maker() as session:
-            async with session.begin():
-                query = select(func.count(ExchangeRate.id_rate))
-                count = (await session.execute(query)).scalar()
-                if count == 0:
-                    initial_rate = ExchangeRate(rate_rub=12.5, source='manual')
-                    session.add(initial_rate)
-        logger.info("База данных инициализирована с использованием SQLAlchemy")
+            schema_state = await conn.run_sync(_prepare_schema)
+            has_rate = (await conn.execute(select(ExchangeRate.id_rate).limit(1))).first()
+            if not has_rate:
+                await conn.execute(ExchangeRate.__table__.insert().values(rate_rub=settings.EXCHANGE_RATE_DEFAULT, source='manual'))
+        logger.info("База данных инициализирована, схема %s", schema_state)
     except Exception as e:
         logger.error("Ошибка инициализации БД с SQLAlchemy: %s", e)
-
-
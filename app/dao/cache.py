@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Ограниченный LRU-кэш в памяти процесса со сроком жизни записей.
+
+    При переполнении вытесняется давно не использованная запись, записи
+    старше ``ttl`` секунд считаются отсутствующими. Кэш не потокобезопасен
+    и рассчитан на один цикл событий.
+
+    Чтение из БД, начатое до сброса ключа, не должно положить в кэш старое
+    значение после сброса. Для этого читающий берёт ``version(key)`` до
+    запроса и передаёт его в ``set``: если ключ за это время сбросили,
+    значение не сохраняется. Версия ключа - номер его последнего сброса;
+    номера хранятся для ``maxsize`` последних сброшенных ключей, для
+    остальных версией считается номер последнего вытесненного.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._clock = 0
+        self._versions: OrderedDict[Hashable, int] = OrderedDict()
+        self._floor = 0
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_skips = 0
+
+    def version(self, key: Hashable) -> int:
+        return self._versions.get(key, self._floor)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or entry[0] < time.monotonic():
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, version: int | None = None) -> None:
+        """Сохраняет значение; с ``version`` - только если ключ с тех пор не сбрасывали."""
+        if version is not None and self.version(key) != version:
+            self.stale_skips += 1
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self._clock += 1
+        self._versions[key] = self._clock
+        self._versions.move_to_end(key)
+        if len(self._versions) > self.maxsize:
+            _, self._floor = self._versions.popitem(last=False)
+        if self._data.pop(key, _MISSING) is not _MISSING:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._clock += 1
+        self._versions.clear()
+        self._floor = self._clock
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_skips": self.stale_skips,
+        }
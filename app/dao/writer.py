@@ -0,0 +1,181 @@
+import asyncio
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from app.config import Settings
+from app.database import create_db_engine, _current_session
+
+
+logger = logging.getLogger(__name__)
+
+# True внутри задачи писателя: операции DAO там выполняются напрямую
+_in_writer: ContextVar[bool] = ContextVar("in_writer", default=False)
+
+
+class WriteQueue:
+    """
+    Единственный писатель SQLite с групповым коммитом.
+
+    Изменяющие операции DAO ставятся в очередь и выполняются одной задачей
+    на выделенном соединении. Писатель набирает до ``max_batch`` операций,
+    выполняет их в одной транзакции и коммитит один раз, после чего каждая
+    операция получает свой результат (например, id нового заказа). Если
+    транзакция пачки не удалась, операции повторяются по одной, чтобы
+    ошибка одной не отменяла остальные.
+    """
+
+    def __init__(self, config: Settings, max_batch: int = 64, max_delay: float = 0.002):
+        self.config = config
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue[tuple[Callable[[], Awaitable[Any]], asyncio.Future]] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._engine = None
+        self._session_maker = None
+        # Метрики
+        self.operations = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self.max_batch_seen = 0
+        self.commit_time_total = 0.0
+
+    async def start(self) -> None:
+        self._engine = create_db_engine(self.config.model_copy(update={"DB_POOL_SIZE": 1, "DB_MAX_OVERFLOW": 0}))
+        self._session_maker = async_sessionmaker(self._engine, class_=AsyncSession, expire_on_commit=False)
+        self._task = asyncio.create_task(self._run(), name="db-writer")
+        logger.info("Писатель БД запущен: пачка до %s операций", self.max_batch)
+
+    async def submit(self, operation: Callable[[], Awaitable[Any]]) -> Any:
+        """Ставит операцию в очередь писателя и ждёт её результат."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+        return batch
+
+    async def _execute(self, batch: list) -> list[tuple[bool, Any]]:
+        """Выполняет пачку в одной транзакции. Ошибка любой операции или коммита откатывает всю пачку."""
+        async with self._session_maker() as session:
+            token = _current_session.set(session)
+            try:
+                outcomes = [(True, await operation()) for operation, _ in batch]
+                started = time.perf_counter()
+                await session.commit()
+                self.commit_time_total += time.perf_counter() - started
+                return outcomes
+            except BaseException:
+                await session.rollback()
+                raise
+            finally:
+                _current_session.reset(token)
+
+    async def _run(self) -> None:
+        _in_writer.set(True)
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.operations += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            try:
+                results = list(zip(batch, await self._execute(batch)))
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [(batch[0], (False, e))]
+                else:
+                    # Откатываем пачку и выполняем операции по одной
+                    self.fallbacks += 1
+                    results = []
+                    for item in batch:
+                        try:
+                            results.append((item, (await self._execute([item]))[0]))
+                        except Exception as single_error:
+                            results.append((item, (False, single_error)))
+            for (_, future), (ok, value) in results:
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается выполнения очереди и закрывает соединение писателя."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Писатель БД остановлен, не выполнено операций: %s", self._queue.qsize())
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self._engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "operations": self.operations,
+            "batches": self.batches,
+            "avg_batch": round(self.operations / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "fallbacks": self.fallbacks,
+            "avg_commit_ms": round(self.commit_time_total / self.batches * 1000, 3) if self.batches else 0.0,
+        }
+
+
+write_queue: WriteQueue | None = None
+
+
+def enable_write_queue(config: Settings) -> WriteQueue:
+    """Включает режим одного писателя: дальнейшие изменяющие операции DAO пойдут через очередь."""
+    global write_queue
+    write_queue = WriteQueue(config, max_batch=config.DB_WRITER_BATCH, max_delay=config.DB_WRITER_MAX_DELAY)
+    return write_queue
+
+
+async def disable_write_queue() -> None:
+    global write_queue
+    if write_queue is not None:
+        queue, write_queue = write_queue, None
+        await queue.stop()
+
+
+def writer_operation(method):
+    """
+    Помечает изменяющий метод DAO.
+
+    Если включён режим одного писателя, вызов выполняется в задаче
+    писателя в составе групповой транзакции; иначе - как обычно, в
+    текущей единице работы.
+    """
+    @functools.wraps(method)
+    async def wrapper(cls, *args, **kwargs):
+        session = _current_session.get()
+        if session is not None:
+            # Последующие чтения этой единицы работы должны видеть запись
+            session.info["has_writes"] = True
+        if write_queue is None or _in_writer.get():
+            return await method(cls, *args, **kwargs)
+        return await write_queue.submit(lambda: method(cls, *args, **kwargs))
+    return wrapper
@@ -1,21 +1,153 @@
-from sqlalchemy import func
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import func, event
 from datetime import datetime
-from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, Session
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession, AsyncEngine
 
-database_url = 'sqlite+aiosqlite:///db.sqlite3'
-engine = create_async_engine(url=database_url)
-async_session_maker = async_sessionmaker(engine, class_=AsyncSession)
+from app.config import Settings, settings
 
 
-class Base(AsyncAttrs, DeclarativeBase):
-    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+def create_db_engine(config: Settings, read_only: bool = False) -> AsyncEngine:
+    """
+    Создаёт движок и настраивает каждое новое соединение по профилю SQLite из настроек.
+
+    ``read_only=True`` даёт отдельный пул читателей: соединения с
+    ``query_only``, которые в режиме WAL не ждут пишущих транзакций.
+    """
+    db_engine = create_async_engine(
+        url=config.DB_URL,
+        pool_size=config.DB_READ_POOL_SIZE if read_only else config.DB_POOL_SIZE,
+        max_overflow=config.DB_READ_MAX_OVERFLOW if read_only else config.DB_MAX_OVERFLOW,
+        connect_args={"timeout": config.DB_BUSY_TIMEOUT / 1000},
+    )
+    if read_only:
+        # journal_mode задаёт пишущий движок, читателю менять файл БД нельзя
+        pragmas = ("PRAGMA query_only=ON",)
+    else:
+        pragmas = (
+            # До создания первой таблицы, иначе прагма ничего не меняет
+            f"PRAGMA auto_vacuum={config.DB_AUTO_VACUUM}",
+            "PRAGMA foreign_keys=ON",
+            f"PRAGMA journal_mode={config.DB_JOURNAL_MODE}",
+            f"PRAGMA synchronous={config.DB_SYNCHRONOUS}",
+        )
+    pragmas += (
+        f"PRAGMA cache_size={config.DB_CACHE_SIZE}",
+        f"PRAGMA mmap_size={config.DB_MMAP_SIZE}",
+        f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT}",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    @event.listens_for(db_engine.sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        # Драйвер sqlite3 сам открывает транзакции только перед DML и не
+        # знает о SAVEPOINT; транзакциями управляем сами, см. do_begin
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(db_engine.sync_engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    return db_engine
+
+
+database_url = settings.DB_URL
+engine = create_db_engine(settings)
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Чтения идут через отдельный пул, чтобы не стоять в очереди за записями
+read_engine = create_db_engine(settings, read_only=True) if settings.DB_READ_ENGINE else engine
+read_session_maker = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+# Сессия текущей единицы работы (апдейта), общая для всех вызовов DAO внутри неё
+_current_session: ContextVar[AsyncSession | None] = ContextVar("db_session", default=None)
 
 
+@asynccontextmanager
+async def unit_of_work():
+    """
+    Одна сессия и одна транзакция на блок кода.
 
+    Все вызовы DAO внутри блока используют эту сессию, коммит выполняется
+    один раз при выходе, откат - при исключении. Вложенный вызов
+    присоединяется к внешней единице работы через точку сохранения
+    (SAVEPOINT): при выходе его изменения сбрасываются в БД, а ошибка
+    откатывает только вложенный блок, не ломая внешнюю транзакцию. То, что
+    можно делать лишь после коммита, регистрируется через ``after_commit``.
+    Соединение берётся из пула только при первом запросе к БД. Внутри блока можно вызвать
+    ``session.commit()``, чтобы отпустить блокировку записи SQLite перед
+    долгими внешними вызовами; следующий запрос начнёт новую транзакцию.
+    """
+    session = _current_session.get()
+    if session is not None:
+        callbacks = session.info.setdefault("after_commit", [])
+        mark = len(callbacks)
+        try:
+            async with session.begin_nested():
+                yield session
+        except BaseException:
+            # Действия откатанного блока не выполняются
+            del callbacks[mark:]
+            raise
+        return
+    async with async_session_maker() as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            _current_session.reset(token)
 
 
+def after_commit(session: AsyncSession, callback) -> None:
+    """
+    Выполнит ``callback()`` после коммита транзакции сессии.
 
+    При откате транзакции зарегистрированные действия отбрасываются.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
 
 
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    # Событие приходит и при RELEASE SAVEPOINT, ждём внешнюю транзакцию
+    if session.in_nested_transaction():
+        return
+    for callback in session.info.pop("after_commit", ()):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit(session):
+    # Откат точки сохранения разбирает unit_of_work
+    if session.in_nested_transaction():
+        return
+    session.info.pop("after_commit", None)
+
+
+@asynccontextmanager
+async def read_session():
+    """
+    Сессия для чтения из пула читателей.
+
+    Если текущая единица работы уже что-то записала, чтение идёт в её
+    сессии, чтобы видеть собственные незакоммиченные изменения.
+    """
+    session = _current_session.get()
+    if session is not None and session.info.get("has_writes"):
+        yield session
+        return
+    async with read_session_maker() as session:
+        yield session
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
@@ -1,30 +1,124 @@
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
-from app.bot.create_bot import bot, dp, stop_bot, start_bot
+from app.bot.create_bot import bot, dp, stop_bot, start_bot, rate_limiter
+from app.bot.updates import UpdateQueue, UpdateDeduplicator
 from app.dao.base import init_db
+from app.dao import writer
+from app.api.dao import user_cache, order_history_cache, ExchangeRateDAO, OrderDAO, RollupDAO
+from app.api.schemas import OrderHistoryOut
+from app.api.exchange_rates import ExchangeRateRefresher, FileRateProvider
+from app.api.repricing import reprice_catalog
+from app.api.counters import CounterReconciler
+from app.api.sessions import SessionSweeper
+from app.api.export import export_orders
+from app.api.analytics import analytics
+from app.api.auth import require_admin, webapp_user
 from app.bot.handlers.user_router import user_router
 from app.config import settings
+from datetime import date, datetime
+from pathlib import Path
 from aiogram.types import Update
-from fastapi import FastAPI, Request
+from aiogram.utils.web_app import WebAppUser
+from fastapi import Depends, FastAPI, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Страницы веб-приложения, которые открывают кнопки бота
+STATIC_DIR = Path(__file__).parent / "static"
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    logging.info("Starting bot setup...")
-    dp.include_router(user_router)
-    await init_db()
-    await start_bot()
+update_queue = UpdateQueue(bot, dp,
+                           shards=settings.UPDATE_SHARDS,
+                           shard_size=settings.UPDATE_SHARD_QUEUE_SIZE,
+                           enqueue_timeout=settings.UPDATE_ENQUEUE_TIMEOUT)
+update_dedup = UpdateDeduplicator(size=settings.UPDATE_DEDUP_SIZE,
+                                  persist=settings.UPDATE_DEDUP_PERSIST)
+rate_refresher = ExchangeRateRefresher(FileRateProvider(settings.EXCHANGE_RATE_FILE),
+                                       interval=settings.EXCHANGE_RATE_REFRESH,
+                                       on_change=reprice_catalog if settings.REPRICE_ON_RATE_CHANGE else None) \
+    if settings.EXCHANGE_RATE_FILE else None
+counter_reconciler = CounterReconciler(interval=settings.STATS_RECONCILE_INTERVAL) \
+    if settings.STATS_RECONCILE_INTERVAL > 0 else None
+session_sweeper = SessionSweeper(interval=settings.SESSION_SWEEP_INTERVAL,
+                                 retention=settings.SESSION_RETENTION,
+                                 chunk_size=settings.SESSION_SWEEP_CHUNK,
+                                 vacuum_pages=settings.SESSION_VACUUM_PAGES) \
+    if settings.SESSION_SWEEP_INTERVAL > 0 else None
+
+
+startup_timings: dict[str, float] = {}
+
+
+async def timed(name: str, coro):
+    """Выполняет шаг запуска и запоминает его длительность в startup_timings."""
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        startup_timings[name] = round(time.perf_counter() - started, 3)
+
+
+async def ensure_webhook() -> None:
+    """Ставит вебхук, только если он ещё не настроен (например, другим воркером)."""
     webhook_url = settings.get_webhook_url()
+    allowed_updates = dp.resolve_used_update_types()
+    info = await bot.get_webhook_info()
+    if info.url == webhook_url and set(info.allowed_updates or []) == set(allowed_updates):
+        logging.info(f"Webhook already set to {webhook_url}")
+        return
     await bot.set_webhook(url=webhook_url,
-                          allowed_updates=dp.resolve_used_update_types(),
+                          allowed_updates=allowed_updates,
                           drop_pending_updates=True)
     logging.info(f"Webhook set to {webhook_url}")
+
+
+async def init_storage() -> None:
+    await init_db()
+    if settings.DB_SINGLE_WRITER:
+        await writer.enable_write_queue(settings).start()
+    await update_dedup.start()
+    await ExchangeRateDAO.reload()
+    if rate_refresher:
+        await rate_refresher.start()
+    if counter_reconciler:
+        await counter_reconciler.start()
+    if session_sweeper:
+        await session_sweeper.start()
+    await analytics.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging.info("Starting bot setup...")
+    started = time.perf_counter()
+    dp.include_router(user_router)
+    if settings.WEBHOOK_MODE == "queue":
+        await update_queue.start()
+    # БД и вебхук не зависят друг от друга
+    await asyncio.gather(timed("storage", init_storage()), timed("webhook", ensure_webhook()))
+    startup_timings["total"] = round(time.perf_counter() - started, 3)
+    logging.info("Startup finished in %.3f s: %s", startup_timings["total"], startup_timings)
+    # Уведомление администраторов не задерживает запуск
+    notify_task = asyncio.create_task(start_bot())
     yield
     logging.info("Shutting down bot...")
     await bot.delete_webhook()
+    if settings.WEBHOOK_MODE == "queue":
+        await update_queue.drain(timeout=settings.UPDATE_DRAIN_TIMEOUT)
+    await update_dedup.stop()
+    if rate_refresher:
+        await rate_refresher.stop()
+    if counter_reconciler:
+        await counter_reconciler.stop()
+    if session_sweeper:
+        await session_sweeper.stop()
+    # Остаток событий записывается до остановки писателя БД
+    await analytics.stop()
+    await writer.disable_write_queue()
+    await notify_task
     await stop_bot()
     logging.info("Webhook deleted")
 
@@ -33,8 +127,81 @@ app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/webhook")
-async def webhook(request: Request) -> None:
-    logging.info("Received webhook request")
-    update = Update.model_validate(await request.json(), context={"bot": bot})
-    await dp.feed_update(bot, update)
-    logging.info("Update processed")
\ No newline at end of file
+async def webhook(request: Request) -> Response:
+    logging.debug("Received webhook request")
+    # Тело сразу валидируется в Update, без промежуточного разбора в dict
+    update = Update.model_validate_json(await request.body(), context={"bot": bot})
+    if update_dedup.is_duplicate(update.update_id):
+        logging.info("Duplicate update %s skipped", update.update_id)
+        return Response(status_code=200)
+    if settings.WEBHOOK_MODE == "queue":
+        if not await update_queue.submit(update):
+            update_dedup.forget(update.update_id)
+            # Telegram повторит доставку, когда очередь освободится
+            return Response(status_code=503)
+        return Response(status_code=200)
+    try:
+        await dp.feed_update(bot, update)
+    except Exception:
+        # Апдейт не обработан - повторная доставка должна пройти
+        update_dedup.forget(update.update_id)
+        raise
+    logging.debug("Update processed")
+    return Response(status_code=200)
+
+
+@app.get("/applications", include_in_schema=False)
+async def applications_page() -> FileResponse:
+    """Страница кнопки «Мои покупки»: историю она запрашивает у /api/orders/history с initData."""
+    return FileResponse(STATIC_DIR / "applications.html")
+
+
+@app.get("/api/orders/history", response_model=OrderHistoryOut)
+async def order_history(user: WebAppUser = Depends(webapp_user), limit: int = Query(20, ge=1, le=100),
+                        before_date: datetime | None = None, before_id: int | None = None) -> dict:
+    """История заказов клиента; клиент - из подписанной initData веб-приложения в X-Telegram-Init-Data."""
+    before = (before_date, before_id) if before_date is not None and before_id is not None else None
+    return await OrderDAO.get_history(user.id, limit=limit, before=before)
+
+
+@app.get("/admin/orders/export", dependencies=[Depends(require_admin)])
+async def export_orders_endpoint(format: str = Query("csv", pattern="^(csv|ndjson)$"),
+                                 date_from: datetime | None = None, date_to: datetime | None = None,
+                                 status: str | None = None, gzip: bool = False) -> StreamingResponse:
+    """Полная выгрузка заказов для бухгалтерии; отдаётся потоком, память не растёт с размером таблицы."""
+    filename = f"orders.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        # Отдаём файлом .gz, а не Content-Encoding: клиент сохранит архив как есть
+        media_type = "application/gzip"
+    return StreamingResponse(export_orders(format, compress=gzip, date_from=date_from, date_to=date_to,
+                                           status=status),
+                             media_type=media_type, headers=headers)
+
+
+@app.get("/admin/sales", dependencies=[Depends(require_admin)])
+async def sales_report(date_from: date, date_to: date,
+                       period: str = Query("day", pattern="^(hour|day)$"), status: str | None = None) -> dict:
+    """Продажи за дни [date_from, date_to) из готовых агрегатов: по статусам и по категориям."""
+    return {
+        "sales": await RollupDAO.get_sales(period, date_from, date_to, status),
+        "categories": await RollupDAO.get_category_sales(period, date_from, date_to, status),
+    }
+
+
+@app.get("/metrics")
+async def metrics() -> dict:
+    return {
+        "update_queue": update_queue.stats(),
+        "update_dedup": update_dedup.stats(),
+        "bot_api": rate_limiter.stats(),
+        "user_cache": user_cache.stats(),
+        "order_history_cache": order_history_cache.stats(),
+        "analytics": analytics.stats(),
+        "stats_reconcile": counter_reconciler.stats() if counter_reconciler else None,
+        "session_sweep": session_sweeper.stats() if session_sweeper else None,
+        "exchange_rate": ExchangeRateDAO.stats() | {"refresh": rate_refresher.stats() if rate_refresher else None},
+        "startup_s": startup_timings,
+        "db_writer": writer.write_queue.stats() if writer.write_queue else None,
+    }
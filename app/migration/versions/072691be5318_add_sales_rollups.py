@@ -0,0 +1,182 @@
+"""add sales rollups
+
+Revision ID: 072691be5318
+Revises: a06b66ac0d21
+Create Date: 2026-10-18 11:21:12.463916
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Триггеры, которые создаёт rollup_ddl
+ROLLUP_TRIGGERS = ('orders_rollup_insert', 'orders_rollup_delete', 'orders_rollup_update', 'orders_rollup_move_items',
+                   'order_items_rollup_insert', 'order_items_rollup_delete', 'order_items_rollup_update',
+                   'products_rollup_category', 'products_rollup_delete')
+
+
+# revision identifiers, used by Alembic.
+revision: str = '072691be5318'
+down_revision: Union[str, Sequence[str], None] = 'a06b66ac0d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# DDL триггеров - копия app.api.models на момент ревизии, чтобы миграция не
+# менялась вместе с моделями.
+# Периоды агрегатов: SQL-выражение начала интервала от даты заказа
+ROLLUP_PERIODS = {
+    'hour': "strftime('%Y-%m-%d %H:00', {})",
+    'day': "date({})",
+}
+
+
+def _sales_delta(row: str, sign: str) -> list[str]:
+    """Прибавляет (sign '+') или вычитает ('-') заказ row (NEW или OLD) в sales_rollups."""
+    statements = []
+    for period, bucket in ROLLUP_PERIODS.items():
+        statements.append(
+            f"INSERT INTO sales_rollups (period, bucket, status, order_count, revenue_rub) "
+            f"VALUES ('{period}', {bucket.format(f'{row}.order_date')}, {row}.status, {sign}1, {sign}{row}.total_amount_rub) "
+            f"ON CONFLICT (period, bucket, status) DO UPDATE SET order_count = order_count + excluded.order_count, "
+            f"revenue_rub = revenue_rub + excluded.revenue_rub")
+    return statements
+
+
+def _category_delta(delta: str, sign: str) -> list[str]:
+    """
+    Прибавляет к category_sales_rollups (или вычитает) строки подзапроса delta.
+
+    delta - шаблон SELECT с колонками bucket, status, category, item_count,
+    quantity, revenue; вместо {bucket} подставляется выражение периода.
+    """
+    statements = []
+    for period, bucket in ROLLUP_PERIODS.items():
+        source = delta.format(bucket=bucket.format("o.order_date"))
+        statements.append(
+            f"INSERT INTO category_sales_rollups (period, bucket, status, category, item_count, quantity, revenue_rub) "
+            f"SELECT '{period}', d.bucket, d.status, d.category, {sign}d.item_count, {sign}d.quantity, {sign}d.revenue "
+            f"FROM ({source}) AS d WHERE true "
+            f"ON CONFLICT (period, bucket, status, category) DO UPDATE SET "
+            f"item_count = item_count + excluded.item_count, quantity = quantity + excluded.quantity, "
+            f"revenue_rub = revenue_rub + excluded.revenue_rub")
+    return statements
+
+
+def _item_delta(row: str) -> str:
+    """Одна позиция заказа row (NEW или OLD) с датой и статусом её заказа."""
+    return (f"SELECT {{bucket}} AS bucket, o.status AS status, COALESCE(p.category, '') AS category, "
+            f"1 AS item_count, {row}.quantity AS quantity, {row}.subtotal AS revenue "
+            f"FROM orders AS o LEFT JOIN products AS p ON p.id_product = {row}.id_product "
+            f"WHERE o.id_order = {row}.id_order")
+
+
+def _order_items_delta(row: str) -> str:
+    """Все позиции заказа row (NEW или OLD) по категориям, с датой и статусом из row."""
+    return (f"SELECT {{bucket}} AS bucket, o.status AS status, COALESCE(p.category, '') AS category, "
+            f"COUNT(*) AS item_count, SUM(i.quantity) AS quantity, SUM(i.subtotal) AS revenue "
+            f"FROM (SELECT {row}.order_date AS order_date, {row}.status AS status) AS o "
+            f"JOIN order_items AS i ON i.id_order = {row}.id_order "
+            f"LEFT JOIN products AS p ON p.id_product = i.id_product GROUP BY 3")
+
+
+def _product_items_delta(row: str, category: str) -> str:
+    """Все продажи товара row (NEW или OLD) по интервалам и статусам с категорией category."""
+    return (f"SELECT {{bucket}} AS bucket, o.status AS status, COALESCE({category}, '') AS category, "
+            f"COUNT(*) AS item_count, SUM(i.quantity) AS quantity, SUM(i.subtotal) AS revenue "
+            f"FROM order_items AS i JOIN orders AS o ON o.id_order = i.id_order "
+            f"WHERE i.id_product = {row}.id_product GROUP BY 1, 2")
+
+
+def _trigger(name: str, timing: str, table: str, statements: list[str], when: str | None = None) -> str:
+    condition = f" WHEN {when}" if when else ""
+    return f"CREATE TRIGGER IF NOT EXISTS {name} {timing} ON {table}{condition} BEGIN {'; '.join(statements)}; END"
+
+
+def rollup_ddl() -> list[str]:
+    """
+    Триггеры, которые ведут sales_rollups и category_sales_rollups.
+
+    Позиции относятся к текущей категории товара и текущим дате и статусу
+    заказа, поэтому смена статуса, даты или категории переносит суммы из
+    одного интервала в другой. Итог всегда совпадает с пересборкой агрегатов
+    ``RollupDAO.rebuild_range``. Позиции удаляемого заказа вычитаются до
+    удаления, каскадное удаление позиций затем уже не находит заказ. Продажи
+    удаляемого товара так же заранее переносятся в пустую категорию: при
+    ON DELETE SET NULL товара в позиции уже нет.
+    """
+    return [
+        _trigger("orders_rollup_insert", "AFTER INSERT", "orders", _sales_delta("NEW", "+")),
+        _trigger("orders_rollup_delete", "BEFORE DELETE", "orders",
+                 _sales_delta("OLD", "-") + _category_delta(_order_items_delta("OLD"), "-")),
+        _trigger("orders_rollup_update", "AFTER UPDATE OF status, order_date, total_amount_rub", "orders",
+                 _sales_delta("OLD", "-") + _sales_delta("NEW", "+")),
+        _trigger("orders_rollup_move_items", "AFTER UPDATE OF status, order_date", "orders",
+                 _category_delta(_order_items_delta("OLD"), "-") + _category_delta(_order_items_delta("NEW"), "+")),
+        _trigger("order_items_rollup_insert", "AFTER INSERT", "order_items", _category_delta(_item_delta("NEW"), "+")),
+        _trigger("order_items_rollup_delete", "AFTER DELETE", "order_items", _category_delta(_item_delta("OLD"), "-")),
+        _trigger("order_items_rollup_update", "AFTER UPDATE OF id_order, id_product, quantity, subtotal", "order_items",
+                 _category_delta(_item_delta("OLD"), "-") + _category_delta(_item_delta("NEW"), "+")),
+        _trigger("products_rollup_category", "AFTER UPDATE OF category", "products",
+                 _category_delta(_product_items_delta("OLD", "OLD.category"), "-")
+                 + _category_delta(_product_items_delta("NEW", "NEW.category"), "+"),
+                 when="OLD.category IS NOT NEW.category"),
+        _trigger("products_rollup_delete", "BEFORE DELETE", "products",
+                 _category_delta(_product_items_delta("OLD", "OLD.category"), "-")
+                 + _category_delta(_product_items_delta("OLD", "NULL"), "+"),
+                 when="COALESCE(OLD.category, '') != ''"),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('category_sales_rollups',
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('bucket', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue_rub', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'bucket', 'status', 'category')
+    )
+    op.create_table('sales_rollups',
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('bucket', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('revenue_rub', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'bucket', 'status')
+    )
+    # ### end Alembic commands ###
+    # Начальное заполнение по существующим заказам, дальше агрегаты ведут триггеры;
+    # на большой БД вместо этого можно запустить python -m app.api.rollups
+    for period, bucket in ROLLUP_PERIODS.items():
+        bucket = bucket.format('o.order_date')
+        op.execute(f"INSERT INTO sales_rollups (period, bucket, status, order_count, revenue_rub) "
+                   f"SELECT '{period}', {bucket}, o.status, COUNT(*), SUM(o.total_amount_rub) FROM orders AS o "
+                   f"GROUP BY 2, 3")
+        op.execute(f"INSERT INTO category_sales_rollups "
+                   f"(period, bucket, status, category, item_count, quantity, revenue_rub) "
+                   f"SELECT '{period}', {bucket}, o.status, COALESCE(p.category, ''), COUNT(*), SUM(i.quantity), "
+                   f"SUM(i.subtotal) FROM orders AS o JOIN order_items AS i ON i.id_order = o.id_order "
+                   f"LEFT JOIN products AS p ON p.id_product = i.id_product GROUP BY 2, 3, 4")
+    for statement in rollup_ddl():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger in ROLLUP_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('sales_rollups')
+    op.drop_table('category_sales_rollups')
+    # ### end Alembic commands ###
@@ -0,0 +1,42 @@
+"""make user first name nullable
+
+Revision ID: 53c6bd26d23c
+Revises: b1b5c9d1d21d
+Create Date: 2026-10-18 11:40:26.806037
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '53c6bd26d23c'
+down_revision: Union[str, Sequence[str], None] = 'b1b5c9d1d21d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_count_triggers() -> None:
+    # Пересоздание таблицы удаляет её триггеры - счётчик строк из 76093d2a3cbe
+    op.execute("CREATE TRIGGER users_count_insert AFTER INSERT ON users BEGIN "
+               "UPDATE table_counters SET row_count = row_count + 1 WHERE table_name = 'users'; END")
+    op.execute("CREATE TRIGGER users_count_delete AFTER DELETE ON users BEGIN "
+               "UPDATE table_counters SET row_count = row_count - 1 WHERE table_name = 'users'; END")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite не умеет ALTER COLUMN - таблица пересоздаётся в batch-режиме
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('first_name', existing_type=sa.VARCHAR(), nullable=True)
+    _create_count_triggers()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("UPDATE users SET first_name = full_name WHERE first_name IS NULL")
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('first_name', existing_type=sa.VARCHAR(), nullable=False)
+    _create_count_triggers()
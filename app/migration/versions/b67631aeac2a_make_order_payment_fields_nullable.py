@@ -0,0 +1,40 @@
+"""make order payment fields nullable
+
+Revision ID: b67631aeac2a
+Revises: b45c6acac0b5
+Create Date: 2026-10-18 10:49:06.797393
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b67631aeac2a'
+down_revision: Union[str, Sequence[str], None] = 'b45c6acac0b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Безымянные CHECK-ограничения не переживают пересоздание таблицы без явной передачи
+ORDERS_CHECKS = (
+    sa.CheckConstraint("status IN ('pending', 'confirmed', 'paid', 'processing_supplier', 'shipped', 'delivered', 'cancelled')"),
+    sa.CheckConstraint("payment_status IN ('unpaid', 'paid', 'refunded')"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite не умеет ALTER COLUMN - таблица пересоздаётся в batch-режиме
+    with op.batch_alter_table('orders', table_args=ORDERS_CHECKS) as batch_op:
+        batch_op.alter_column('payment_method', existing_type=sa.VARCHAR(), nullable=True)
+        batch_op.alter_column('tracking_number', existing_type=sa.VARCHAR(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('orders', table_args=ORDERS_CHECKS) as batch_op:
+        batch_op.alter_column('tracking_number', existing_type=sa.VARCHAR(), nullable=False)
+        batch_op.alter_column('payment_method', existing_type=sa.VARCHAR(), nullable=False)
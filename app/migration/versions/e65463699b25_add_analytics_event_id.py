@@ -0,0 +1,49 @@
+"""add analytics event id
+
+Revision ID: e65463699b25
+Revises: 53c6bd26d23c
+Create Date: 2026-10-18 12:02:21.085059
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e65463699b25'
+down_revision: Union[str, Sequence[str], None] = '53c6bd26d23c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rebuild(columns: list[sa.Column], primary_key: list[str], select_sql: str) -> None:
+    # SQLite не меняет первичный ключ на месте - данные переносятся в новую таблицу
+    op.create_table('_analytics_new', *columns,
+                    sa.Column('value', sa.Text(), nullable=False),
+                    sa.Column('recorded_at', sa.DateTime(), server_default=sa.text("(datetime('now', 'localtime'))"), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+                    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+                    sa.PrimaryKeyConstraint(*primary_key))
+    op.execute(select_sql)
+    op.drop_table('analytics')
+    op.rename_table('_analytics_new', 'analytics')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rebuild([sa.Column('id_event', sa.Integer(), autoincrement=True, nullable=False),
+              sa.Column('key', sa.String(), nullable=False)], ['id_event'],
+             "INSERT INTO _analytics_new (key, value, recorded_at, created_at, updated_at) "
+             "SELECT key, value, recorded_at, created_at, updated_at FROM analytics ORDER BY recorded_at")
+    op.create_index('ix_analytics_key_recorded_at', 'analytics', ['key', 'recorded_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_analytics_key_recorded_at', table_name='analytics')
+    # Из событий с одинаковыми (key, recorded_at) остаётся первое
+    _rebuild([sa.Column('key', sa.String(), nullable=False)], ['key', 'recorded_at'],
+             "INSERT OR IGNORE INTO _analytics_new (key, value, recorded_at, created_at, updated_at) "
+             "SELECT key, value, recorded_at, created_at, updated_at FROM analytics ORDER BY id_event")